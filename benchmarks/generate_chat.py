@@ -0,0 +1,129 @@
+import argparse
+import os
+import sys
+import numpy as np
+
+# Writes synthetic WhatsApp exports for benchmarking, in any of the layouts
+# chat_parser understands
+#
+#   python benchmarks/generate_chat.py chat.txt --messages 1000000 --users 50 \
+#       --format ios_24h --emoji-density 0.2 --media-ratio 0.05
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chat_parser import FORMATS
+
+FORMAT_NAMES = [chat_format.name for chat_format in FORMATS]
+
+WORDS = ('hai kya raha nahi haan theek achha chal kal aaj abhi bhai yaar call video gym college '
+         'hello okay sure thanks where when what time tomorrow today tonight coming going done '
+         'meeting lunch dinner movie game python java code work home office party weekend').split()
+EMOJI = ['😂', '❤️', '👍', '🙏', '😭', '🔥', '😊', '🤣', '👍🏽', '👨‍👩‍👧', '🇮🇳', '1️⃣']
+MEDIA = ['<Media omitted>', 'image omitted', 'video omitted', 'sticker omitted', 'audio omitted']
+SYSTEM = 'Messages and calls are end-to-end encrypted. No one outside of this chat, not even WhatsApp, can read or listen to them.'
+
+# Messages generated and written at a time
+CHUNK_SIZE = 100000
+
+# Days a generated chat spans by default, whatever its size, so time based
+# stages see a realistic number of months and days
+DEFAULT_DAYS = 3 * 365
+
+
+def format_stamps(stamps, chat_format):
+    # Header of every message in the layout named chat_format
+    parts = stamps.astype('datetime64[s]')
+    days = parts.astype('datetime64[D]')
+    years = days.astype('datetime64[Y]').astype(np.int64) + 1970
+    months = days.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    mdays = (days - days.astype('datetime64[M]')).astype(np.int64) + 1
+    seconds = (parts - days).astype(np.int64)
+    hours, minutes, secs = seconds // 3600, seconds // 60 % 60, seconds % 60
+
+    fields = zip(years.tolist(), months.tolist(), mdays.tolist(), hours.tolist(), minutes.tolist(), secs.tolist())
+    if chat_format == 'android_12h':
+        return [f"{m}/{d}/{y % 100:02}, {(h - 1) % 12 + 1}:{mi:02} {'PM' if h >= 12 else 'AM'} - "
+                for y, m, d, h, mi, s in fields]
+    if chat_format == 'android_24h':
+        return [f"{d:02}/{m:02}/{y}, {h:02}:{mi:02} - " for y, m, d, h, mi, s in fields]
+    if chat_format == 'ios_12h':
+        return [f"[{m}/{d}/{y % 100:02}, {(h - 1) % 12 + 1}:{mi:02}:{s:02} {'PM' if h >= 12 else 'AM'}] "
+                for y, m, d, h, mi, s in fields]
+    return [f"[{d:02}/{m:02}/{y}, {h:02}:{mi:02}:{s:02}] " for y, m, d, h, mi, s in fields]
+
+
+def generate_bodies(rng, count, emoji_density, media_ratio, link_ratio, multiline_ratio):
+    lengths = rng.integers(1, 12, count)
+    words = rng.choice(WORDS, lengths.sum())
+    cuts = np.cumsum(lengths)[:-1]
+    bodies = [' '.join(chunk).capitalize() for chunk in np.split(words, cuts)]
+
+    kind = rng.random(count)
+    for i in np.flatnonzero(kind < media_ratio):
+        bodies[i] = MEDIA[i % len(MEDIA)]
+    for i in np.flatnonzero((kind >= media_ratio) & (kind < media_ratio + link_ratio)):
+        bodies[i] += f' https://example.com/{i}'
+    for i in np.flatnonzero(rng.random(count) < emoji_density):
+        bodies[i] += ' ' + ''.join(rng.choice(EMOJI, rng.integers(1, 4)))
+    for i in np.flatnonzero(rng.random(count) < multiline_ratio):
+        bodies[i] += '\n' + ' '.join(rng.choice(WORDS, 5)) + '\n' + ' '.join(rng.choice(WORDS, 3))
+    return bodies
+
+
+def generate_chat(path, messages=100000, users=2, chat_format='android_12h', emoji_density=0.1,
+                  media_ratio=0.05, link_ratio=0.02, multiline_ratio=0.02, seed=0, start='2020-01-01',
+                  days=DEFAULT_DAYS):
+    # Messages arrive with exponential gaps, spread over about days days,
+    # from users with Zipf-like activity; the first line is the usual
+    # encryption notice
+    mean_gap = days * 24 * 60 * 60 / max(messages, 1)
+    rng = np.random.default_rng(seed)
+    names = [f'User {i + 1}' for i in range(users)]
+    weights = 1 / np.arange(1, users + 1)
+    weights /= weights.sum()
+    clock = np.datetime64(start, 's').astype(np.int64)
+
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(format_stamps(np.array([clock]), chat_format)[0] + SYSTEM + '\n')
+        for done in range(0, messages, CHUNK_SIZE):
+            count = min(CHUNK_SIZE, messages - done)
+            stamps = clock + np.cumsum(rng.exponential(mean_gap, count)).astype(np.int64)
+            clock = stamps[-1]
+            senders = rng.choice(users, count, p=weights)
+            bodies = generate_bodies(rng, count, emoji_density, media_ratio, link_ratio, multiline_ratio)
+            headers = format_stamps(stamps, chat_format)
+            f.write(''.join(f'{header}{names[sender]}: {body}\n'
+                            for header, sender, body in zip(headers, senders.tolist(), bodies)))
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic WhatsApp chat export.")
+    parser.add_argument('output', help="File to write")
+    parser.add_argument('--messages', type=int, default=100000, help="Number of messages (default: 100000)")
+    parser.add_argument('--users', type=int, default=2, help="Number of participants (default: 2)")
+    parser.add_argument('--format', choices=FORMAT_NAMES, default='android_12h',
+                        help="Export layout (default: android_12h)")
+    parser.add_argument('--emoji-density', type=float, default=0.1,
+                        help="Share of messages with emoji (default: 0.1)")
+    parser.add_argument('--media-ratio', type=float, default=0.05,
+                        help="Share of media placeholders (default: 0.05)")
+    parser.add_argument('--link-ratio', type=float, default=0.02,
+                        help="Share of messages with a link (default: 0.02)")
+    parser.add_argument('--multiline-ratio', type=float, default=0.02,
+                        help="Share of multi-line messages (default: 0.02)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS,
+                        help=f"Days the chat spans (default: {DEFAULT_DAYS})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    generate_chat(args.output, args.messages, args.users, args.format, args.emoji_density,
+                  args.media_ratio, args.link_ratio, args.multiline_ratio, args.seed, days=args.days)
+    print(f"Wrote {args.messages:,} messages to {args.output} ({os.path.getsize(args.output):,} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Times how long the GUI takes to show its window, run from source or as the
+# frozen executable built from whatsapp.spec. Each run starts the app with
+# --startup-time, which quits it once the window is up and the analysis
+# libraries are loaded
+#
+#   python benchmarks/measure_startup.py
+#   python benchmarks/measure_startup.py dist/WhatsAppAnalyzer.exe --runs 10
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Columns of the report: seconds from launching the process until...
+MILESTONES = [
+    ('started', "the GUI module starts (interpreter and, when frozen, bootloader)"),
+    ('imports', "the GUI module is imported"),
+    ('window', "the window is shown"),
+    ('libraries', "pandas, matplotlib and the analysis modules are loaded"),
+]
+
+
+def run_once(command, work_dir):
+    path = os.path.join(work_dir, 'startup.json')
+    if os.path.exists(path):
+        os.remove(path)
+    launched = time.time()
+    subprocess.run(command + ['--startup-time', path], check=True, timeout=300)
+    with open(path, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+
+    started = report['started_at'] - launched
+    times = {'started': started}
+    times.update({name: started + seconds for name, seconds in report['seconds'].items()})
+    return report['frozen'], times
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the GUI's startup time.")
+    parser.add_argument('executable', nargs='?',
+                        help="Frozen executable to time (default: whatsapp_analyzer_gui.py with this Python)")
+    parser.add_argument('--runs', type=int, default=5, help="Number of launches (default: 5)")
+    parser.add_argument('-o', '--output', help="JSON file to write every run to")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.executable:
+        command = [os.path.abspath(args.executable)]
+    else:
+        command = [sys.executable, os.path.join(ROOT, 'whatsapp_analyzer_gui.py')]
+
+    runs = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for run in range(args.runs):
+            frozen, times = run_once(command, work_dir)
+            runs.append(times)
+            print(f"run {run + 1}: " + ', '.join(f"{name} {times[name]:.3f} s" for name, _ in MILESTONES))
+
+    print(f"\nMedian of {len(runs)} {'frozen' if frozen else 'source'} launches, seconds until")
+    for name, description in MILESTONES:
+        print(f"  {statistics.median(times[name] for times in runs):7.3f}  {description}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'command': command, 'frozen': frozen, 'runs': runs}, f, indent=2)
+        print(f"Runs written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
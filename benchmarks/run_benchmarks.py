@@ -0,0 +1,202 @@
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+
+# Times each analysis stage on synthetic chats of growing size and writes the
+# results as JSON, so runs of different versions can be compared
+#
+#   python benchmarks/run_benchmarks.py --sizes 10000 100000 1000000 -o results.json
+#   python benchmarks/run_benchmarks.py --compare baseline.json -o results.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from chat_cache import load_chat
+from chat_charts import build_dashboard, render_dashboard
+from chat_dynamics import ChatDynamics
+from chat_index import ChatIndex
+from chat_parser import classify_messages, parse_chat
+from chat_render import rendering_to, stats_digest
+from chat_stats import ChatStats, count_activity, count_words, get_emoji_counts
+from generate_chat import DEFAULT_DAYS, FORMAT_NAMES, generate_chat
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+
+# (name, stages it needs, function) in run order. Functions get the results
+# of earlier stages, so each one times only its own work
+STAGES = [
+    ('parse', [], lambda r: parse_chat(r['chat_file'])),
+    ('classify', ['parse'], lambda r: classify_messages(r['parse']['MESSAGE'])),
+    ('emoji', ['parse'], lambda r: get_emoji_counts(r['parse'])),
+    ('aggregate', ['parse'], lambda r: count_activity(r['parse'])),
+    ('index', ['parse'], lambda r: ChatIndex.from_frame(r['parse'])),
+    ('word_frequencies', ['parse'], lambda r: count_words(r['parse'], max_words=0)[0]),
+    ('dynamics', ['index'], lambda r: ChatDynamics.from_arrays(r['index'].dates, r['index'].user_codes,
+                                                               r['index'].users)),
+    ('stats', ['parse'], lambda r: ChatStats.from_frame(r['parse'])),
+    ('render', ['parse', 'stats'], lambda r: render(r['parse'], r['stats'])),
+    ('render_cold', ['parse', 'stats'], lambda r: render_cached(r['parse'], r['stats'], r['render_dir'])),
+    ('render_warm', ['render_cold'], lambda r: render_cached(r['parse'], r['stats'], r['render_dir'])),
+    ('cache_cold', [], lambda r: load_chat(r['chat_file'], cache_dir=r['cache_dir'], workers=1)),
+    ('cache_warm', ['cache_cold'], lambda r: load_chat(r['chat_file'], cache_dir=r['cache_dir'], workers=1)),
+]
+STAGE_NAMES = [name for name, _, _ in STAGES]
+
+
+def prepare(name, results):
+    # Compute a stage's result untimed, for stages that need it
+    if name not in results:
+        _, needs, function = next(stage for stage in STAGES if stage[0] == name)
+        for need in needs:
+            prepare(need, results)
+        results[name] = function(results)
+
+
+def render(df, stats):
+    # Drawing alone, without the render cache
+    with rendering_to(None):
+        fig = build_dashboard(df, stats)
+        fig.savefig(io.BytesIO(), format='png')
+    return fig
+
+
+def render_cached(df, stats, render_dir):
+    with rendering_to(render_dir), render_dashboard(df, stats, stats_digest(stats), 'png') as path:
+        return path
+
+
+def measure(function, results, trace_memory):
+    # Wall and CPU time of one call and, with trace_memory, the peak of
+    # memory allocated during it (numpy and pandas buffers included)
+    if trace_memory:
+        tracemalloc.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    value = function(results)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return value, wall, cpu, peak
+
+
+def run_size(messages, args, work_dir):
+    chat_file = os.path.join(work_dir, f'chat_{messages}.txt')
+    generate_chat(chat_file, messages, args.users, args.format, args.emoji_density,
+                  args.media_ratio, args.link_ratio, args.multiline_ratio, args.seed, days=args.days)
+
+    rows = []
+    results = {'chat_file': chat_file, 'cache_dir': os.path.join(work_dir, f'cache_{messages}'),
+               'render_dir': os.path.join(work_dir, f'renders_{messages}')}
+    for name, needs, function in STAGES:
+        if args.stages and name not in args.stages:
+            continue
+        for need in needs:
+            prepare(need, results)
+
+        # Timed without tracing, which slows allocation-heavy code down. The
+        # cache stages change the cache, so they are only run once
+        once = name.startswith('cache') or name == 'render_cold'
+        repeat = 1 if once else args.repeat
+        timings = [measure(function, results, False) for _ in range(repeat)]
+        value, wall, cpu, _ = min(timings, key=lambda timing: timing[1])
+        peak = measure(function, results, True)[3] if args.memory and not once else None
+        results[name] = value
+        rows.append({'messages': messages, 'stage': name, 'seconds': wall, 'cpu_seconds': cpu,
+                     'peak_bytes': peak})
+        print(f"{messages:>10,} {name:<18} {wall:8.3f} s" + (f" {peak / 2**20:9.1f} MB" if peak else ''))
+
+    file_bytes = os.path.getsize(chat_file)
+    for row in rows:
+        row['file_bytes'] = file_bytes
+    os.remove(chat_file)
+    return rows
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'matplotlib': matplotlib.__version__,
+    }
+
+
+def compare(results, baseline):
+    # Ratio of this run's time to the baseline's for every (size, stage) in both
+    before = {(row['messages'], row['stage']): row['seconds'] for row in baseline['results']}
+    print(f"\n{'messages':>10} {'stage':<18} {'before':>8} {'after':>8} {'ratio':>6}")
+    for row in results:
+        key = (row['messages'], row['stage'])
+        if key in before and before[key] > 0:
+            print(f"{row['messages']:>10,} {row['stage']:<18} {before[key]:8.3f} {row['seconds']:8.3f} "
+                  f"{row['seconds'] / before[key]:6.2f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis stages on synthetic chats.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Chat sizes in messages (default: 10000 100000 1000000)")
+    parser.add_argument('--stages', nargs='+', choices=STAGE_NAMES, help="Only time these stages")
+    parser.add_argument('--users', type=int, default=20, help="Participants per chat (default: 20)")
+    parser.add_argument('--format', choices=FORMAT_NAMES, default='android_12h',
+                        help="Export layout (default: android_12h)")
+    parser.add_argument('--emoji-density', type=float, default=0.1)
+    parser.add_argument('--media-ratio', type=float, default=0.05)
+    parser.add_argument('--link-ratio', type=float, default=0.02)
+    parser.add_argument('--multiline-ratio', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS,
+                        help=f"Days each chat spans (default: {DEFAULT_DAYS})")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="Runs per stage; the fastest is reported (default: 1)")
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="Skip the extra traced run that measures peak memory")
+    parser.add_argument('-o', '--output', default='benchmark_results.json',
+                        help="JSON file to write (default: benchmark_results.json)")
+    parser.add_argument('--compare', help="Earlier results JSON to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for messages in args.sizes:
+            rows.extend(run_size(messages, args, work_dir))
+
+    config = {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'environment': environment(), 'config': config, 'results': rows}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(rows, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
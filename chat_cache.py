@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import pandas as pd
+from chat_columns import ChatColumns
+from chat_parallel import PARALLEL_MIN_BYTES, parse_chat_parallel
+from chat_parser import FORMATS, concat_frames, no_progress, parse_lines, settle_frames
+from chat_reader import is_utf16_export, is_zip_export, open_export
+from chat_profile import stage
+from chat_stats import ChatStats
+
+# Parsed chats are kept as ChatColumns folders named after the export's
+# content hash, with the dashboard aggregates for the same content in a
+# .stats.pkl sidecar. The folders are memory-mapped when loaded
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.whatsapp_analyzer', 'cache')
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+# Bump whenever the parser output changes so stale entries are never reused
+CACHE_VERSION = 11
+
+INDEX_FILE = 'index.json'
+ENTRY_SUFFIX = '.chat'
+STATS_SUFFIX = '.stats.pkl'
+FORMAT_FILE = 'format.json'
+
+
+def file_digests(chat_file, prefix_size=None, chunk_size=1024 * 1024, progress=no_progress):
+    # Hash the whole file and, in the same pass, its first prefix_size bytes
+    size = os.path.getsize(chat_file)
+    digest = hashlib.blake2b(str(CACHE_VERSION).encode(), digest_size=20)
+    prefix_digest = None
+    read = 0
+    with open(chat_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            if prefix_size is not None and prefix_digest is None and read + len(chunk) >= prefix_size:
+                cut = prefix_size - read
+                digest.update(chunk[:cut])
+                prefix_digest = digest.hexdigest()
+                digest.update(chunk[cut:])
+            else:
+                digest.update(chunk)
+            read += len(chunk)
+            progress('Hashing', read, size)
+    return digest.hexdigest(), prefix_digest
+
+
+def stat_key(chat_file):
+    stat = os.stat(chat_file)
+    return f"{os.path.abspath(chat_file)}|{stat.st_size}|{stat.st_mtime_ns}|{CACHE_VERSION}"
+
+
+def load_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_index(cache_dir, index):
+    path = os.path.join(cache_dir, INDEX_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(path + '.tmp', path)
+
+
+def entry_path(cache_dir, digest, suffix=ENTRY_SUFFIX):
+    return os.path.join(cache_dir, digest + suffix)
+
+
+def remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def path_size(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(entry.stat().st_size for entry in os.scandir(path))
+
+
+def save_entry(cache_dir, digest, df, chat_format, stats):
+    path = entry_path(cache_dir, digest)
+    if os.path.exists(path + '.tmp'):
+        shutil.rmtree(path + '.tmp')
+    ChatColumns.from_frame(df).save(path + '.tmp')
+    with open(os.path.join(path + '.tmp', FORMAT_FILE), 'w', encoding='utf-8') as f:
+        json.dump([chat_format.name, chat_format.date_order], f)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(path + '.tmp', path)
+
+    path = entry_path(cache_dir, digest, STATS_SUFFIX)
+    pd.to_pickle(stats, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def load_entry(cache_dir, digest):
+    path = entry_path(cache_dir, digest)
+    stats_path = entry_path(cache_dir, digest, STATS_SUFFIX)
+    if not os.path.exists(path) or not os.path.exists(stats_path):
+        return None
+
+    columns = ChatColumns.load(path)
+    with open(os.path.join(path, FORMAT_FILE), 'r', encoding='utf-8') as f:
+        name, date_order = json.load(f)
+
+    # Mark the entry as recently used for eviction
+    os.utime(path)
+    os.utime(stats_path)
+
+    df = columns.to_frame()
+    chat_format = next(f for f in FORMATS if f.name == name)._replace(date_order=date_order)
+    return df, chat_format, pd.read_pickle(stats_path)
+
+
+def evict(cache_dir, max_bytes=MAX_CACHE_BYTES, keep=None):
+    # Drop least recently used entries until the cache fits in max_bytes.
+    # The entry for digest keep (the one just saved) always stays, even when
+    # it is bigger than max_bytes on its own; otherwise large exports would
+    # be parsed, saved and deleted again on every load
+    entries = {}
+    for name in os.listdir(cache_dir):
+        if name.endswith(ENTRY_SUFFIX) or name.endswith(STATS_SUFFIX):
+            path = os.path.join(cache_dir, name)
+            digest = name.split('.')[0]
+            if digest == keep:
+                continue
+            used, size, names = entries.get(digest, (0, 0, []))
+            entries[digest] = (max(used, os.path.getmtime(path)), size + path_size(path), names + [name])
+
+    total = sum(size for _, size, _ in entries.values())
+    for used, size, names in sorted(entries.values()):
+        if total <= max_bytes:
+            break
+        for name in names:
+            remove_path(os.path.join(cache_dir, name))
+        total -= size
+
+
+def find_prefix_candidate(index, chat_file):
+    # Re-exports of a chat usually keep its file name and only grow, so the
+    # largest smaller cached export with the same name may be a prefix.
+    # Only the text of plain UTF-8 exports starts at the same byte offsets
+    # as the file, so archives and UTF-16 exports are always parsed whole
+    if is_zip_export(chat_file) or is_utf16_export(chat_file):
+        return None
+    path = os.path.abspath(chat_file)
+    size = os.path.getsize(chat_file)
+    best = None
+    for key, digest in index.items():
+        parts = key.rsplit('|', 3)
+        if len(parts) != 4 or parts[3] != str(CACHE_VERSION):
+            continue
+        other_path, other_size = parts[0], int(parts[1])
+        if os.path.basename(other_path) != os.path.basename(path) or other_size >= size:
+            continue
+        if best is None or other_size > best[0]:
+            best = (other_size, digest)
+    return best
+
+
+def parse_tail(chat_file, offset, chat_format, progress=no_progress):
+    # The tail's messages and its date order, settled over the tail alone
+    with open_export(chat_file) as text:
+        tail = text.section(offset, text.end)
+        df, tail_format = parse_lines(tail, chat_format,
+                                      on_batch=lambda parsed: progress('Parsing', tail.position - offset, tail.end - offset))
+    return df, tail_format.date_order
+
+
+def count_messages(df, progress=no_progress):
+    progress('Counting messages', 0, len(df))
+    stats = ChatStats.from_frame(df)
+    progress('Counting messages', len(df), len(df))
+    return stats
+
+
+def extend_entry(cache_dir, candidate, chat_file, progress=no_progress):
+    # The cached export is a prefix of chat_file: parse only what follows it
+    offset, digest = candidate
+    previous = load_entry(cache_dir, digest)
+    if previous is None:
+        return None
+
+    old_df, chat_format, old_stats = previous
+    new_df, tail_order = parse_tail(chat_file, offset, chat_format, progress)
+    if new_df.empty:
+        # Nothing that starts a message was added, e.g. only blank lines
+        return old_df, chat_format, old_stats
+
+    # A day above 12 in the tail may settle an order the cached chat couldn't
+    (old_df, new_df), date_order, (old_changed, _) = settle_frames(
+        [old_df, new_df], [chat_format.date_order, tail_order], chat_format.date_order)
+    if old_changed:
+        old_stats = count_messages(old_df, progress)
+    return (concat_frames([old_df, new_df]), chat_format._replace(date_order=date_order),
+            old_stats.merge(count_messages(new_df, progress)))
+
+
+def parse_full(chat_file, progress=no_progress, workers=None):
+    # Large exports are split into shards parsed on all cores; a compressed
+    # archive would have to be inflated by every one of them, so .zip
+    # exports are parsed in this process
+    size = os.path.getsize(chat_file)
+    if workers is None:
+        workers = os.cpu_count() if size >= PARALLEL_MIN_BYTES and not is_zip_export(chat_file) else 1
+    if workers > 1 and not is_zip_export(chat_file):
+        return parse_chat_parallel(chat_file, workers, progress)
+
+    with open_export(chat_file) as text:
+        df, chat_format = parse_lines(text, on_batch=lambda parsed: progress(
+            'Parsing', text.position - text.start, text.end - text.start))
+    return df, chat_format, count_messages(df, progress)
+
+
+def load_chat(chat_file, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, progress=no_progress, workers=None):
+    # Returns (df, stats) for an export. Unchanged files (same path, size and
+    # mtime) are looked up without reading them; otherwise the content hash
+    # decides, so a touched or copied export still hits the cache. When an
+    # earlier export of the same chat is a byte prefix of this one, only the
+    # new tail is parsed and its aggregates merged into the cached ones.
+    # progress(stage, done, total) is called as work advances; an exception
+    # raised from it aborts the load
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        index = load_index(cache_dir)
+        key = stat_key(chat_file)
+        digest = index.get(key)
+        candidate = None
+        if digest is None:
+            candidate = find_prefix_candidate(index, chat_file)
+            with stage('hash'):
+                digest, prefix_digest = file_digests(chat_file, candidate and candidate[0], progress=progress)
+        with stage('cache load'):
+            cached = load_entry(cache_dir, digest)
+        is_new = cached is None
+        if is_new and candidate and prefix_digest == candidate[1]:
+            cached = extend_entry(cache_dir, candidate, chat_file, progress)
+    except (OSError, ValueError, KeyError, StopIteration, EOFError, pickle.UnpicklingError):
+        df, _, stats = parse_full(chat_file, progress, workers)
+        return df, stats
+
+    if cached is None:
+        cached = parse_full(chat_file, progress, workers)
+
+    df, chat_format, stats = cached
+    try:
+        if is_new:
+            with stage('cache save', len(df)):
+                save_entry(cache_dir, digest, df, chat_format, stats)
+                evict(cache_dir, max_bytes, keep=digest)
+
+        # Forget index entries whose data has been evicted
+        index = {k: v for k, v in index.items() if os.path.exists(entry_path(cache_dir, v))}
+        if os.path.exists(entry_path(cache_dir, digest)):
+            index[key] = digest
+        save_index(cache_dir, index)
+    except OSError:
+        pass
+
+    return df, stats
@@ -0,0 +1,505 @@
+import shutil
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.image import imread
+import numpy as np
+from wordcloud import WordCloud
+from chat_profile import stage
+from chat_render import cached_file, render_caching, render_key, stats_digest
+
+# Charts are drawn on plain Figures (no pyplot), so they work the same
+# embedded in Tk or saved by the headless batch mode. Each chart has its own
+# draw function so the GUI can render them one at a time
+
+# Custom color palettes
+USER_COLORS = ['#40E0D0', '#8B00FF', '#00CED1', '#9370DB', '#48D1CC', '#9932CC']
+TYPE_COLORS = ['#E0FFFF', '#E6E6FA', '#AFEEEE', '#D8BFD8', '#B0E0E6', '#DDA0DD']
+
+# Style for all plots
+TITLE_COLOR = '#40E0D0'  # Turquoise
+LABEL_COLOR = '#8B00FF'  # Violet
+
+
+def apply_style():
+    # Set style for attractive visualizations
+    matplotlib.rcParams['axes.grid'] = True
+    matplotlib.rcParams['grid.alpha'] = 0.3
+    matplotlib.rcParams['axes.facecolor'] = '#ffffff'
+    matplotlib.rcParams['figure.facecolor'] = '#E6F3F5'
+    matplotlib.rcParams['font.family'] = 'Segoe UI'
+
+
+def draw_user_share(fig, ax, df, stats):
+    # Messages by User (Pie Chart)
+    user_counts = stats.user_counts
+    wedges, texts, autotexts = ax.pie(user_counts.values, 
+                                    labels=user_counts.index, 
+                                    autopct='%1.1f%%',
+                                    colors=USER_COLORS[:len(user_counts)],
+                                    shadow=True)
+    ax.set_title('Message Distribution by User', 
+                pad=20, 
+                fontsize=12, 
+                fontweight='bold',
+                color=TITLE_COLOR)
+
+
+def draw_message_types(fig, ax, df, stats):
+    # Message Types by User (Stacked Bar Chart)
+    message_types = stats.type_counts
+    bottom = np.zeros(len(message_types.index))
+    
+    for i, col in enumerate(message_types.columns):
+        ax.bar(message_types.index, 
+              message_types[col], 
+              bottom=bottom,
+              label=col, 
+              color=TYPE_COLORS[i % len(TYPE_COLORS)])
+        bottom += message_types[col]
+    
+    ax.set_title('Message Types by User', fontsize=12, fontweight='bold', color=TITLE_COLOR)
+    ax.tick_params(axis='x', rotation=30, colors=LABEL_COLOR)
+    ax.set_ylabel('Count', color=LABEL_COLOR)
+    ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+    ax.grid(True, alpha=0.3)
+
+
+def draw_hourly_activity(fig, ax, df, stats):
+    # Activity by Hour (Line Plot)
+    for i, user in enumerate(stats.user_counts.index):
+        hours = range(24)
+        counts = stats.hourly.loc[user]
+        ax.plot(hours, 
+               counts.values, 
+               marker='o', 
+               linestyle='-', 
+               linewidth=2,
+               label=user, 
+               color=USER_COLORS[i % len(USER_COLORS)])
+    
+    ax.set_title('Activity by Hour (Per User)', fontsize=12, fontweight='bold', color=TITLE_COLOR)
+    ax.set_xlabel('Hour of Day', color=LABEL_COLOR)
+    ax.set_ylabel('Number of Messages', color=LABEL_COLOR)
+    ax.tick_params(colors=LABEL_COLOR)
+    ax.set_xticks(range(0, 24, 2))
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+
+
+def draw_monthly(fig, ax, df, stats):
+    # Messages by Month, only months that have messages
+    monthly_by_user = stats.monthly[stats.monthly.sum(axis=1) > 0]
+    
+    x = np.arange(len(monthly_by_user.index))
+    width = 0.35
+    n_users = len(monthly_by_user.columns)
+    
+    for i, user in enumerate(monthly_by_user.columns):
+        offset = width * (i - (n_users-1)/2)
+        ax.bar(x + offset, 
+              monthly_by_user[user], 
+              width, 
+              label=user,
+              color=USER_COLORS[i % len(USER_COLORS)])
+    
+    ax.set_title('Messages by Month (Per User)', fontsize=12, fontweight='bold', color=TITLE_COLOR)
+    ax.set_xticks(x)
+    ax.set_xticklabels(monthly_by_user.index, rotation=45, color=LABEL_COLOR)
+    ax.set_ylabel('Number of Messages', color=LABEL_COLOR)
+    ax.tick_params(colors=LABEL_COLOR)
+    ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+    ax.grid(True, alpha=0.3)
+
+
+def draw_heatmap(fig, ax, df, stats):
+    # Daily Activity Patterns (Heatmap)
+    pivot_table = stats.heatmap
+    
+    im = ax.imshow(pivot_table.values, 
+                 cmap='RdPu',  # Purple-based colormap
+                 aspect='auto',
+                 interpolation='nearest')
+    fig.colorbar(im, ax=ax, label='Number of Messages')
+    
+    ax.set_title('Activity Heatmap (Day vs Hour)', fontsize=12, fontweight='bold', color=TITLE_COLOR)
+    ax.set_ylabel('Day of Week', color=LABEL_COLOR)
+    ax.set_xlabel('Hour of Day', color=LABEL_COLOR)
+    ax.set_yticks(range(7))
+    ax.set_yticklabels(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
+                      color=LABEL_COLOR)
+    ax.set_xticks(range(0, 24, 2))
+    ax.tick_params(colors=LABEL_COLOR)
+
+
+def draw_message_lengths(fig, ax, df, stats):
+    # Message Length Distribution, drawn from the per-user length counts
+    bp = ax.bxp(stats.length_boxes(),
+                  patch_artist=True,
+                  medianprops=dict(color="#40E0D0"),  # Turquoise median line
+                  flierprops=dict(marker='o', markerfacecolor='#8B00FF'))  # Violet outliers
+    
+    # Color each box
+    for i, box in enumerate(bp['boxes']):
+        box.set(facecolor=USER_COLORS[i % len(USER_COLORS)])
+    
+    ax.set_title('Message Length Distribution by User', fontsize=12, fontweight='bold', color=TITLE_COLOR)
+    ax.set_ylabel('Message Length (characters)', color=LABEL_COLOR)
+    ax.tick_params(axis='x', rotation=30, colors=LABEL_COLOR)
+    ax.grid(True, alpha=0.3)
+
+
+def draw_reply_matrix(fig, ax, df, stats):
+    # Who replies to whom (counts) and how fast (mean minutes, as color)
+    pairs = stats.dynamics().pairs
+    users = list(stats.user_counts.index)
+    replies = pairs['Replies'].unstack().reindex(index=users, columns=users)
+    minutes = pairs['Mean (min)'].unstack().reindex(index=users, columns=users)
+    
+    im = ax.imshow(minutes.to_numpy(dtype=float),
+                 cmap='RdPu',
+                 aspect='auto',
+                 interpolation='nearest')
+    fig.colorbar(im, ax=ax, label='Mean Reply Time (min)')
+    if len(users) <= 12:
+        shades = im.norm(minutes.to_numpy(dtype=float))
+        for (i, j), count in np.ndenumerate(replies.to_numpy(dtype=float)):
+            if count > 0:
+                ax.text(j, i, f'{count:,.0f}', ha='center', va='center', fontsize=8,
+                        color='white' if shades[i, j] > 0.5 else '#2c3e50')
+    
+    ax.set_title('Who Replies to Whom', fontsize=12, fontweight='bold', color=TITLE_COLOR)
+    ax.set_xlabel('Replying To', color=LABEL_COLOR)
+    ax.set_ylabel('Replier', color=LABEL_COLOR)
+    ax.set_xticks(range(len(users)))
+    ax.set_xticklabels(users, rotation=30, ha='right', color=LABEL_COLOR)
+    ax.set_yticks(range(len(users)))
+    ax.set_yticklabels(users, color=LABEL_COLOR)
+    ax.grid(False)
+
+
+def draw_reply_latency(fig, ax, df, stats):
+    # Reply Time Distribution, as each user's share of replies per time range
+    latency = stats.dynamics().latency
+    x = np.arange(len(latency.columns))
+    for i, user in enumerate(stats.user_counts.index):
+        counts = latency.loc[user].to_numpy()
+        if counts.sum() == 0:
+            continue
+        ax.plot(x,
+               counts / counts.sum() * 100,
+               marker='o',
+               linestyle='-',
+               linewidth=2,
+               label=user,
+               color=USER_COLORS[i % len(USER_COLORS)])
+    
+    ax.set_title('Reply Time Distribution (Per User)', fontsize=12, fontweight='bold', color=TITLE_COLOR)
+    ax.set_xticks(x)
+    ax.set_xticklabels(latency.columns, rotation=30, ha='right', color=LABEL_COLOR)
+    ax.set_ylabel('% of Replies', color=LABEL_COLOR)
+    ax.tick_params(colors=LABEL_COLOR)
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+
+
+def draw_conversation_starters(fig, ax, df, stats):
+    # Conversations Started by User (Bar Chart)
+    dynamics = stats.dynamics()
+    started = dynamics.users['Conversations Started'].reindex(stats.user_counts.index, fill_value=0)
+    ax.bar(started.index,
+          started.values,
+          color=[USER_COLORS[i % len(USER_COLORS)] for i in range(len(started))])
+    
+    gap = dynamics.session_gap / 60
+    ax.set_title(f'Conversations Started ({len(dynamics.sessions):,} conversations, {gap:g} min gap)',
+                fontsize=12, fontweight='bold', color=TITLE_COLOR)
+    ax.tick_params(axis='x', rotation=30, colors=LABEL_COLOR)
+    ax.tick_params(axis='y', colors=LABEL_COLOR)
+    ax.set_ylabel('Conversations', color=LABEL_COLOR)
+    ax.grid(True, alpha=0.3)
+
+
+def draw_streaks(fig, ax, df, stats):
+    # Longest and current runs of consecutive active days per user
+    dynamics = stats.dynamics()
+    users = dynamics.users.reindex(stats.user_counts.index, fill_value=0)
+    x = np.arange(len(users.index))
+    ax.bar(x - 0.2, users['Longest Streak (days)'], 0.4, label='Longest', color=USER_COLORS[0])
+    ax.bar(x + 0.2, users['Current Streak (days)'], 0.4, label='Current', color=USER_COLORS[1])
+    
+    longest, current = dynamics.chat_streaks
+    ax.set_title(f'Daily Streaks (chat: longest {longest}, current {current} days)',
+                fontsize=12, fontweight='bold', color=TITLE_COLOR)
+    ax.set_xticks(x)
+    ax.set_xticklabels(users.index, rotation=30, color=LABEL_COLOR)
+    ax.set_ylabel('Days', color=LABEL_COLOR)
+    ax.tick_params(colors=LABEL_COLOR)
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+
+
+def word_cloud_image(words):
+    # Create and generate word cloud
+    wordcloud = WordCloud(
+        width=1200,
+        height=400,
+        background_color='white',
+        colormap='PuBu',  # Purple-Blue colormap
+        max_words=100,
+        contour_width=3,
+        contour_color='#40E0D0'  # Turquoise border
+    )
+    if not render_caching():
+        return wordcloud.generate_from_frequencies(words).to_array()
+
+    # Laying out the words is the slowest part of the dashboard, so the
+    # bitmap is cached for the word frequencies and reused at any chart size
+    # or file format
+    with cached_file(render_key('word cloud', sorted(words.items())), 'png',
+                     lambda path: wordcloud.generate_from_frequencies(words).to_image().save(path, format='png')) as path:
+        return imread(path, format='png')
+
+
+def draw_word_cloud(fig, ax, df, stats):
+    # Display word cloud
+    ax.imshow(word_cloud_image(stats.top_words()), interpolation='bilinear')
+    ax.set_title('Most Common Words in Chat', 
+                fontsize=12, 
+                fontweight='bold',
+                color='#40E0D0',
+                pad=20)
+    ax.axis('off')
+
+
+# Dashboard charts in display order: (name, draw function, full width)
+CHARTS = [
+    ('users', draw_user_share, False),
+    ('types', draw_message_types, False),
+    ('hourly', draw_hourly_activity, False),
+    ('monthly', draw_monthly, False),
+    ('heatmap', draw_heatmap, False),
+    ('lengths', draw_message_lengths, False),
+    ('replies', draw_reply_matrix, False),
+    ('latency', draw_reply_latency, False),
+    ('starters', draw_conversation_starters, False),
+    ('streaks', draw_streaks, False),
+    ('words', draw_word_cloud, True),
+]
+
+# Charts drawn from the conversation dynamics, which change with the
+# stats' session gap
+SESSION_CHARTS = ['replies', 'latency', 'starters', 'streaks']
+
+# Size of a single chart (inches at 100 dpi); full width charts are twice as wide
+CHART_SIZE = (7.5, 3.5)
+
+
+def chart_size(full_width):
+    width, height = CHART_SIZE
+    return (width * 2, height * 1.2) if full_width else (width, height)
+
+
+def chat_colors(n):
+    # Workspaces can hold dozens of chats, more than the user palette has
+    cmap = matplotlib.colormaps['tab20']
+    return [cmap(i % cmap.N) for i in range(n)]
+
+
+def chat_label_size(n):
+    # Smaller tick labels as more chats share an axis
+    return max(6, min(10, 220 / max(n, 1)))
+
+
+def draw_chat_volume(fig, ax, comparison):
+    # Messages and replies (messages answering another sender) per chat
+    chats = comparison.chats.sort_values('messages')
+    y = np.arange(len(chats))
+    ax.barh(y + 0.2, chats['messages'], 0.4, label='Messages', color=USER_COLORS[0])
+    ax.barh(y - 0.2, chats['replies'], 0.4, label='Replies', color=USER_COLORS[1])
+    
+    ax.set_title('Message and Reply Volume by Chat', fontsize=12, fontweight='bold', color=TITLE_COLOR)
+    ax.set_yticks(y)
+    ax.set_yticklabels(chats.index, fontsize=chat_label_size(len(chats)), color=LABEL_COLOR)
+    ax.set_xlabel('Number of Messages', color=LABEL_COLOR)
+    ax.tick_params(colors=LABEL_COLOR)
+    ax.legend(loc='lower right')
+    ax.grid(True, alpha=0.3)
+
+
+def draw_chat_timeline(fig, ax, comparison):
+    # Messages per calendar month, one line per chat
+    monthly = comparison.monthly
+    x = np.arange(len(monthly.index))
+    for color, chat in zip(chat_colors(len(monthly.columns)), monthly.columns):
+        ax.plot(x, monthly[chat].to_numpy(), linewidth=1.5, label=chat, color=color)
+    
+    ax.set_title('Messages per Month by Chat', fontsize=12, fontweight='bold', color=TITLE_COLOR)
+    step = max(1, len(x) // 24)
+    ax.set_xticks(x[::step])
+    ax.set_xticklabels(monthly.index[::step], rotation=45, color=LABEL_COLOR)
+    ax.set_ylabel('Number of Messages', color=LABEL_COLOR)
+    ax.tick_params(colors=LABEL_COLOR)
+    if len(monthly.columns) <= 20:
+        ax.legend(bbox_to_anchor=(1.01, 1), loc='upper left', fontsize=chat_label_size(len(monthly.columns)))
+    ax.grid(True, alpha=0.3)
+
+
+def draw_chat_hours(fig, ax, comparison):
+    # Share of each chat's messages per hour of day, so chats of any size compare
+    hourly = comparison.hourly
+    totals = hourly.sum(axis=1).replace(0, 1)
+    im = ax.imshow(hourly.div(totals, axis=0).to_numpy() * 100,
+                 cmap='RdPu',
+                 aspect='auto',
+                 interpolation='nearest')
+    fig.colorbar(im, ax=ax, label='% of Chat Messages')
+    
+    ax.set_title('Activity by Hour (Per Chat)', fontsize=12, fontweight='bold', color=TITLE_COLOR)
+    ax.set_xlabel('Hour of Day', color=LABEL_COLOR)
+    ax.set_yticks(range(len(hourly.index)))
+    ax.set_yticklabels(hourly.index, fontsize=chat_label_size(len(hourly.index)), color=LABEL_COLOR)
+    ax.set_xticks(range(0, 24, 2))
+    ax.tick_params(colors=LABEL_COLOR)
+    ax.grid(False)
+
+
+def draw_chat_types(fig, ax, comparison):
+    # Message type mix of every chat, as shares of its messages
+    types = comparison.types
+    shares = types.div(types.sum(axis=1).replace(0, 1), axis=0) * 100
+    y = np.arange(len(shares.index))
+    left = np.zeros(len(shares.index))
+    for i, col in enumerate(shares.columns):
+        ax.barh(y, shares[col], left=left, label=col, color=TYPE_COLORS[i % len(TYPE_COLORS)])
+        left += shares[col].to_numpy()
+    
+    ax.set_title('Message Types by Chat', fontsize=12, fontweight='bold', color=TITLE_COLOR)
+    ax.set_yticks(y)
+    ax.set_yticklabels(shares.index, fontsize=chat_label_size(len(shares.index)), color=LABEL_COLOR)
+    ax.set_xlabel('% of Messages', color=LABEL_COLOR)
+    ax.set_xlim(0, 100)
+    ax.invert_yaxis()
+    ax.tick_params(colors=LABEL_COLOR)
+    ax.legend(bbox_to_anchor=(1.01, 1), loc='upper left')
+
+
+def draw_chat_emoji(fig, ax, comparison):
+    # Emoji per 100 messages in every chat
+    chats = comparison.chats
+    rate = (chats['emoji'] / chats['messages'].replace(0, 1) * 100).sort_values()
+    ax.barh(np.arange(len(rate)), rate.to_numpy(), color=chat_colors(len(rate)))
+    
+    ax.set_title('Emoji Usage by Chat', fontsize=12, fontweight='bold', color=TITLE_COLOR)
+    ax.set_yticks(np.arange(len(rate)))
+    ax.set_yticklabels(rate.index, fontsize=chat_label_size(len(rate)), color=LABEL_COLOR)
+    ax.set_xlabel('Emoji per 100 Messages', color=LABEL_COLOR)
+    ax.tick_params(colors=LABEL_COLOR)
+    ax.grid(True, alpha=0.3)
+
+
+# Workspace comparison charts, drawn from a chat_workspace.Comparison; all
+# full width
+COMPARE_CHARTS = [
+    ('volume', draw_chat_volume, True),
+    ('timeline', draw_chat_timeline, True),
+    ('hours', draw_chat_hours, True),
+    ('types', draw_chat_types, True),
+    ('emoji', draw_chat_emoji, True),
+]
+
+
+def build_chart(name, *data, charts=CHARTS):
+    # One chart on its own figure; data is what the chart's draw function
+    # takes: (df, stats) for CHARTS, the comparison for COMPARE_CHARTS
+    apply_style()
+    _, draw, full_width = next(chart for chart in charts if chart[0] == name)
+    with stage(f'chart: {name}'):
+        fig = Figure(figsize=chart_size(full_width), dpi=100)
+        fig.patch.set_facecolor('#E6F3F5')
+        ax = fig.add_subplot()
+        ax.set_facecolor('#ffffff')
+        draw(fig, ax, *data)
+        fig.tight_layout(pad=1.5)
+    return fig
+
+
+def build_dashboard(df, stats):
+    # All charts on one figure, as in the saved dashboard image
+    apply_style()
+    
+    # Two charts per row, full width ones on a taller row of their own
+    rows, cell = [], 0
+    for _, _, full_width in CHARTS:
+        if full_width:
+            cell += cell % 2
+            rows.append(1.2)
+            cell += 2
+        else:
+            if cell % 2 == 0:
+                rows.append(1)
+            cell += 1
+    
+    fig = Figure(figsize=(15, 3.5 * sum(rows)), dpi=100)
+    fig.patch.set_facecolor('#E6F3F5')
+    
+    # Create a GridSpec to have better control over subplot sizes
+    gs = fig.add_gridspec(len(rows), 2, height_ratios=rows)
+    
+    cell = 0
+    for name, draw, full_width in CHARTS:
+        if full_width:
+            cell += cell % 2
+            ax = fig.add_subplot(gs[cell // 2, :])
+            cell += 2
+        else:
+            ax = fig.add_subplot(gs[cell // 2, cell % 2])
+            cell += 1
+        ax.set_facecolor('#ffffff')
+        with stage(f'chart: {name}'):
+            draw(fig, ax, df, stats)
+    
+    # Adjust layout
+    fig.tight_layout(pad=3.0)
+    
+    return fig
+
+
+def save_figure(fig, path, image_format):
+    fig.savefig(path, format=image_format, facecolor=fig.get_facecolor())
+
+
+def chart_options(name, stats):
+    # What besides the aggregates changes how a chart looks
+    return (stats.session_gap,) if name in SESSION_CHARTS else ()
+
+
+def snapshot(stats, session_gap):
+    # The stats as of session_gap (by default their current gap), which the
+    # render key and the drawing then share even when the gap is changed
+    # while a worker is rendering
+    return stats.with_session_gap(stats.session_gap if session_gap is None else session_gap)
+
+
+def render_chart(name, df, stats, digest, session_gap=None):
+    # PNG bytes of one dashboard chart as the GUI shows it, drawn only when
+    # this chart of these aggregates isn't in the render cache yet
+    stats = snapshot(stats, session_gap)
+    key = render_key('chart', digest, name, chart_options(name, stats), CHART_SIZE)
+    with cached_file(key, 'png', lambda path: save_figure(build_chart(name, df, stats), path, 'png')) as path:
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+def render_dashboard(df, stats, digest, image_format, session_gap=None):
+    # Context manager yielding the dashboard image file (png, svg or pdf)
+    # from the render cache
+    stats = snapshot(stats, session_gap)
+    key = render_key('dashboard', digest, [chart_options(name, stats) for name, _, _ in CHARTS], image_format)
+    return cached_file(key, image_format,
+                       lambda path: save_figure(build_dashboard(df, stats), path, image_format))
+
+
+def export_dashboard(df, stats, path, image_format, digest=None, session_gap=None):
+    with stage(f'export: {image_format}'):
+        with render_dashboard(df, stats, digest or stats_digest(stats), image_format, session_gap) as image:
+            shutil.copyfile(image, path)
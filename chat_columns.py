@@ -0,0 +1,123 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# pandas keeps text in Arrow buffers when pyarrow is installed, and then the
+# message column can share the UTF-8 buffer below without a copy
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+ARRAYS = ['stamps', 'user_codes', 'type_codes', 'offsets', 'text']
+META_FILE = 'meta.json'
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+# Fields derived from int64 epoch seconds, computed on demand instead of
+# being stored as extra columns
+def epoch_seconds(dates):
+    return np.asarray(dates).astype('datetime64[s]').astype(np.int64)
+
+
+def hour_of_day(stamps):
+    return (stamps // 3600 % 24).astype(np.int8)
+
+
+def day_of_week(stamps):
+    # Monday is 0; 1970-01-01 was a Thursday
+    return ((stamps // SECONDS_PER_DAY + 3) % 7).astype(np.int8)
+
+
+def month_of_year(stamps):
+    # January is 0
+    return (stamps.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64) % 12).astype(np.int8)
+
+
+def encode_text(messages):
+    # One UTF-8 buffer for all messages plus n + 1 offsets into it
+    messages = messages.fillna('')
+    if pa is not None:
+        array = pa.array(messages, type=pa.large_string())
+        if isinstance(array, pa.ChunkedArray):
+            array = array.combine_chunks()
+        offsets = np.frombuffer(array.buffers()[1], dtype=np.int64)[array.offset:array.offset + len(array) + 1]
+        text = np.frombuffer(array.buffers()[2], dtype=np.uint8)[offsets[0]:offsets[-1]]
+        return text, offsets - offsets[0]
+
+    encoded = [message.encode('utf-8') for message in messages]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(message) for message in encoded])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def decode_text(text, offsets):
+    if pa is not None:
+        array = pa.LargeStringArray.from_buffers(len(offsets) - 1, pa.py_buffer(offsets), pa.py_buffer(text))
+        return pd.Series(pd.array(array, dtype='str'))
+
+    data = text.tobytes()
+    return pd.Series([data[a:b].decode('utf-8') for a, b in zip(offsets[:-1], offsets[1:])], dtype='str')
+
+
+class ChatColumns:
+    # Compact form of a parsed chat: int64 epoch seconds, small integer user
+    # and type codes, and all message text in one UTF-8 buffer where message
+    # i is text[offsets[i]:offsets[i + 1]]. Saved as plain .npy files so a
+    # cached chat can be memory-mapped, and to_frame() builds the DataFrame
+    # the rest of the app uses on top of these arrays
+    def __init__(self, stamps, user_codes, users, type_codes, types, text, offsets):
+        self.stamps = stamps            # int64 epoch seconds
+        self.user_codes = user_codes    # code into users
+        self.users = users              # user names
+        self.type_codes = type_codes    # code into types
+        self.types = types              # message type names
+        self.text = text                # uint8 UTF-8 buffer
+        self.offsets = offsets          # int64, one more than there are messages
+
+    def __len__(self):
+        return len(self.stamps)
+
+    @classmethod
+    def from_frame(cls, df):
+        users = df['USER'].astype('category')
+        types = df['TYPE'].astype('category')
+        text, offsets = encode_text(df['MESSAGE'])
+        return cls(
+            stamps=epoch_seconds(df['DATE']),
+            user_codes=users.cat.codes.to_numpy(),
+            users=[str(user) for user in users.cat.categories],
+            type_codes=types.cat.codes.to_numpy(),
+            types=[str(name) for name in types.cat.categories],
+            text=text,
+            offsets=offsets,
+        )
+
+    def to_frame(self):
+        # copy=False keeps the columns on the (possibly memory-mapped) arrays
+        return pd.DataFrame({
+            'DATE': self.stamps.view('datetime64[s]'),
+            'USER': pd.Categorical.from_codes(self.user_codes, categories=self.users),
+            'MESSAGE': decode_text(self.text, self.offsets),
+            'TYPE': pd.Categorical.from_codes(self.type_codes, categories=self.types),
+        }, copy=False)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, name + '.npy'), getattr(self, name))
+        with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'users': self.users, 'types': self.types}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        # With mmap, arrays are paged in from the file as they are used
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r' if mmap else None)
+                  for name in ARRAYS}
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if len(arrays['offsets']) != len(arrays['stamps']) + 1 or arrays['offsets'][-1] != len(arrays['text']):
+            raise ValueError("Inconsistent chat columns")
+        return cls(users=meta['users'], types=meta['types'], **arrays)
@@ -0,0 +1,193 @@
+import numpy as np
+import pandas as pd
+from chat_columns import SECONDS_PER_DAY, epoch_seconds
+
+# A silence longer than this many seconds ends a conversation: the next
+# message starts a new session and is not counted as a reply
+SESSION_GAP = 60 * 60
+
+# Minute edges grouping reply latencies for the latency chart; the last
+# group runs up to the session gap
+LATENCY_EDGES = [0, 1, 2, 5, 10, 30, 60, 180, 360, 720]
+
+
+def minutes_label(minutes):
+    return f'{minutes // 60} h' if minutes >= 60 and minutes % 60 == 0 else f'{minutes} min'
+
+
+def latency_groups(session_gap):
+    # (first minute, label) of every latency group below the session gap
+    last = session_gap // 60
+    edges = [edge for edge in LATENCY_EDGES if edge < last] or [0]
+    groups = []
+    for start, end in zip(edges, edges[1:] + [last]):
+        if start == 0 and end == 1:
+            label = '< 1 min'
+        elif end - start <= 1:
+            label = minutes_label(start)
+        else:
+            label = f'{minutes_label(start)} - {minutes_label(end)}'
+        groups.append((start, label))
+    return groups
+
+
+def sort_by_time(stamps, user_codes):
+    # Exports are in time order already; only out of order ones are sorted
+    if len(stamps) > 1 and (stamps[1:] < stamps[:-1]).any():
+        order = np.argsort(stamps, kind='stable')
+        return stamps[order], user_codes[order]
+    return stamps, user_codes
+
+
+def find_replies(stamps, user_codes, session_gap=SESSION_GAP):
+    # Which of the time-ordered messages are replies: sent by another user
+    # than the message before, at most session_gap seconds after it
+    replies = np.zeros(len(stamps), dtype=bool)
+    replies[1:] = (user_codes[1:] != user_codes[:-1]) & (np.diff(stamps) <= session_gap)
+    return replies
+
+
+def histogram_quantile(histogram, q):
+    # Per row of a count histogram, the first bin holding the q-quantile
+    cumulative = np.cumsum(histogram, axis=1)
+    target = cumulative[:, -1:] * q
+    return (cumulative < target).sum(axis=1)
+
+
+def count_streaks(days, user_codes, n_users):
+    # Longest and current run of consecutive active days, per user and for
+    # the whole chat. days must be non-decreasing; a stable sort by user
+    # (a radix sort for small codes) keeps every user's days in order
+    order = np.argsort(user_codes.astype(np.int16 if n_users < 2 ** 15 else np.int32), kind='stable')
+    users, days_by_user = user_codes[order], days[order]
+
+    # One entry per active (user, day)
+    first = np.ones(len(users), dtype=bool)
+    first[1:] = (users[1:] != users[:-1]) | (days_by_user[1:] != days_by_user[:-1])
+    users, days_by_user = users[first], days_by_user[first]
+
+    # Runs break where the user changes or a day is skipped
+    breaks = np.ones(len(users), dtype=bool)
+    breaks[1:] = (users[1:] != users[:-1]) | (days_by_user[1:] != days_by_user[:-1] + 1)
+    run_lengths = np.diff(np.append(np.flatnonzero(breaks), len(users)))
+    run_users = users[breaks]
+    run_last_days = days_by_user[np.append(np.flatnonzero(breaks)[1:], len(users))[:len(run_users)] - 1]
+
+    longest = np.zeros(n_users, dtype=np.int64)
+    np.maximum.at(longest, run_users, run_lengths)
+    current = np.zeros(n_users, dtype=np.int64)
+    last_day = days.max(initial=0)
+    ending = run_last_days == last_day
+    current[run_users[ending]] = run_lengths[ending]
+    active = np.bincount(users, minlength=n_users)
+
+    # The chat's own streaks, over the days anyone wrote
+    chat_days = days[np.append(True, days[1:] != days[:-1])] if len(days) else days
+    chat_breaks = np.append(True, chat_days[1:] != chat_days[:-1] + 1)
+    chat_runs = np.diff(np.append(np.flatnonzero(chat_breaks), len(chat_days)))
+    chat = (int(chat_runs.max(initial=0)), int(chat_runs[-1]) if len(chat_runs) else 0)
+    return longest, current, active, chat
+
+
+class ChatDynamics:
+    # Who replies to whom and how fast, conversations and daily streaks of a
+    # chat. A session is a run of messages without a silence longer than
+    # session_gap; its first message starts the conversation, and a message
+    # within a session from another sender than the one before is a reply
+    # to that sender. Every pass is a diff, cumsum or bincount over the
+    # time-ordered messages, so the cost stays linear in the chat's size
+    def __init__(self, users, pairs, latency, sessions, chat_streaks, session_gap):
+        self.users = users                  # per user: replies, conversations started, streaks
+        self.pairs = pairs                  # per (replier, replied to): replies and latency
+        self.latency = latency              # replier x latency group, reply counts
+        self.sessions = sessions            # one row per session
+        self.chat_streaks = chat_streaks    # (longest, current) daily streak of the chat
+        self.session_gap = session_gap      # seconds
+
+    @classmethod
+    def from_arrays(cls, dates, user_codes, users, session_gap=SESSION_GAP):
+        session_gap = int(session_gap)
+        # Latencies are counted in whole minutes up to the gap
+        if session_gap < 60:
+            raise ValueError(f"The session gap must be at least a minute, not {session_gap} seconds.")
+        stamps, codes = sort_by_time(epoch_seconds(dates), np.asarray(user_codes, dtype=np.int64))
+        n_users = len(users)
+        names = np.array([str(user) for user in users], dtype=object)
+
+        # Sessions
+        gaps = np.diff(stamps)
+        starts = np.flatnonzero(np.append(True, gaps > session_gap)) if len(stamps) else np.array([], dtype=np.int64)
+        ends = np.append(starts[1:], len(stamps))[:len(starts)] - 1
+        starters = codes[starts]
+        sessions = pd.DataFrame({
+            'Start': stamps[starts].view('datetime64[s]'),
+            'End': stamps[ends].view('datetime64[s]'),
+            'Messages': ends - starts + 1,
+            'Starter': pd.Categorical.from_codes(starters, categories=names),
+        })
+
+        # Replies: sender changes within a session
+        is_reply = find_replies(stamps, codes, session_gap)[1:]
+        repliers, replied = codes[1:][is_reply], codes[:-1][is_reply]
+        seconds = gaps[is_reply]
+        minutes = np.minimum(seconds // 60, session_gap // 60)
+
+        pair_codes = repliers * n_users + replied
+        pair_replies = np.bincount(pair_codes, minlength=n_users * n_users)
+        pair_seconds = np.bincount(pair_codes, weights=seconds, minlength=n_users * n_users)
+        pair_quick = np.bincount(pair_codes, weights=minutes < 5, minlength=n_users * n_users)
+        found = np.flatnonzero(pair_replies)
+        pairs = pd.DataFrame({
+            'Replies': pair_replies[found],
+            'Mean (min)': pair_seconds[found] / pair_replies[found] / 60,
+            'Within 5 min (%)': pair_quick[found] / pair_replies[found] * 100,
+        }, index=pd.MultiIndex.from_arrays([names[found // n_users], names[found % n_users]],
+                                           names=['Replier', 'Replying To']))
+
+        # Latency per replier at minute resolution, for exact quantiles
+        bins = session_gap // 60 + 1
+        histogram = np.bincount(repliers * bins + minutes, minlength=n_users * bins).reshape(n_users, bins)
+        groups = latency_groups(session_gap)
+        latency = pd.DataFrame(np.add.reduceat(histogram, [start for start, _ in groups], axis=1),
+                               index=pd.Index(names, name='USER'),
+                               columns=pd.Index([label for _, label in groups], name='Latency'))
+
+        longest, current, active, chat_streaks = count_streaks(stamps // SECONDS_PER_DAY, codes, n_users)
+        sent = histogram.sum(axis=1)
+        messages = np.bincount(codes, minlength=n_users)
+        user_table = pd.DataFrame({
+            'Messages': messages,
+            'Replies Sent': sent,
+            'Replies Received': np.bincount(replied, minlength=n_users),
+            'Median Reply (min)': np.where(sent > 0, histogram_quantile(histogram, 0.5), np.nan),
+            '90% Replies Within (min)': np.where(sent > 0, histogram_quantile(histogram, 0.9), np.nan),
+            'Conversations Started': np.bincount(starters, minlength=n_users),
+            'Active Days': active,
+            'Longest Streak (days)': longest,
+            'Current Streak (days)': current,
+        }, index=pd.Index(names, name='USER'))
+
+        # Only users with messages; reply times are NaN for users who never replied
+        present = messages > 0
+        return cls(user_table[present], pairs, latency[present], sessions, chat_streaks, session_gap)
+
+    def summary(self):
+        # Chat-wide figures, for a status line or export
+        durations = (self.sessions['End'] - self.sessions['Start']).dt.total_seconds() / 60
+        return {
+            'sessions': len(self.sessions),
+            'median_session_messages': float(self.sessions['Messages'].median()) if len(self.sessions) else 0.0,
+            'median_session_minutes': float(durations.median()) if len(self.sessions) else 0.0,
+            'longest_streak_days': self.chat_streaks[0],
+            'current_streak_days': self.chat_streaks[1],
+            'session_gap_minutes': self.session_gap / 60,
+        }
+
+    def tables(self):
+        return {
+            'user_dynamics': self.users,
+            'reply_pairs': self.pairs,
+            'reply_latency': self.latency,
+            'sessions': self.sessions,
+            'dynamics_summary': pd.Series(self.summary(), name='value').rename_axis('Measure').to_frame(),
+        }
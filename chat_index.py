@@ -0,0 +1,223 @@
+import string
+from collections import Counter
+import numpy as np
+import pandas as pd
+from wordcloud import STOPWORDS
+from chat_parser import BATCH_SIZE
+
+# Common WhatsApp words left out of the word cloud, on top of wordcloud's own list
+STOP_WORDS = {'media', 'omitted', 'message', 'deleted', 'http', 'https', 'www', 'com'} | STOPWORDS
+PUNCTUATION = str.maketrans('', '', string.punctuation)
+
+# Words are indexed for chats with at most this many word occurrences. Each
+# one takes two int32 in memory and in the cache; past the limit the index
+# keeps only the users and dates of messages, word counts per user or period
+# are not available and searches match substrings. None indexes every chat
+MAX_INDEXED_WORDS = 20 * 1000 * 1000
+
+
+def tokenize(messages):
+    # Lowercase, strip punctuation and drop stop words and short words, for
+    # a whole batch of messages at once. The result has one row per word,
+    # indexed like the message it came from
+    words = messages.str.lower().str.translate(PUNCTUATION).str.split().explode()
+    return words[(words.str.len() > 2) & ~words.isin(STOP_WORDS)]
+
+
+def top_codes(counts, k):
+    # Codes of the k largest non-zero counts, largest first and equal counts
+    # in code order, without sorting every count
+    if k < len(counts):
+        threshold = np.partition(counts, len(counts) - k)[len(counts) - k]
+        above = np.flatnonzero(counts > threshold)
+        top = np.concatenate([above, np.flatnonzero(counts == threshold)[:k - len(above)]])
+    else:
+        top = np.arange(len(counts))
+    top = top[np.argsort(-counts[top], kind='stable')]
+    return top[counts[top] > 0]
+
+
+class ChatIndex:
+    # Inverted index of the cleaned words of a chat. Message IDs are row
+    # positions in the chat's frame; the user and date of every message are
+    # kept alongside, so word counts and searches for any user or period are
+    # answered with array operations instead of re-tokenizing the chat.
+    # Without words (tokens is None, see MAX_INDEXED_WORDS) only the user
+    # and date columns are kept
+    def __init__(self, vocab, tokens, message_ids, user_codes, users, dates):
+        self.vocab = vocab              # distinct words
+        self.tokens = tokens            # word code of every occurrence, in message order
+        self.message_ids = message_ids  # message of every occurrence
+        self.user_codes = user_codes    # user code of every message
+        self.users = users              # user names
+        self.dates = dates              # datetime64 of every message
+        self.has_words = tokens is not None
+        if not self.has_words:
+            return
+
+        # Postings: the sorted, distinct messages containing word w are
+        # postings[offsets[w]:offsets[w + 1]]
+        order = np.lexsort((message_ids, tokens))
+        words, ids = tokens[order], message_ids[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (words[1:] != words[:-1]) | (ids[1:] != ids[:-1])
+        self.postings = ids[first]
+        self.offsets = np.searchsorted(words[first], np.arange(len(vocab) + 1))
+        self.lookup = pd.Index(vocab)
+
+    @classmethod
+    def from_frame(cls, df, batch_size=BATCH_SIZE, max_words=MAX_INDEXED_WORDS, on_words=None):
+        # Tokenized batch by batch; only the integer codes of each batch are
+        # kept. on_words, if given, is called with the distinct words of every
+        # batch and their counts, so they can be counted in the same pass
+        messages = df['MESSAGE'].reset_index(drop=True)
+        vocab = {}
+        tokens, message_ids = [], []
+        indexed = 0
+        for start in range(0, len(messages), batch_size):
+            words = tokenize(messages.iloc[start:start + batch_size])
+            codes, uniques = pd.factorize(words)
+            if on_words is not None:
+                on_words(uniques, np.bincount(codes, minlength=len(uniques)))
+            indexed += len(codes)
+            if tokens is None:
+                continue
+            if max_words is not None and indexed > max_words:
+                vocab, tokens, message_ids = {}, None, None
+                continue
+            mapping = np.array([vocab.setdefault(word, len(vocab)) for word in uniques], dtype=np.int32)
+            tokens.append(mapping[codes])
+            message_ids.append(words.index.to_numpy(dtype=np.int32))
+
+        if tokens is not None:
+            tokens = np.concatenate(tokens) if tokens else np.array([], dtype=np.int32)
+            message_ids = np.concatenate(message_ids) if message_ids else np.array([], dtype=np.int32)
+
+        users = df['USER'].astype('category')
+        return cls(
+            vocab=np.array(list(vocab), dtype=object),
+            tokens=tokens,
+            message_ids=message_ids,
+            user_codes=users.cat.codes.to_numpy(dtype=np.int32),
+            users=np.array(users.cat.categories, dtype=object),
+            dates=df['DATE'].to_numpy(),
+        )
+
+    def merge(self, other, max_words=MAX_INDEXED_WORDS):
+        # Index of this chat's messages followed by other's; words and users
+        # new in other are appended, so this index's codes stay valid
+        users = pd.Index(self.users).append(pd.Index(other.users)).unique()
+        vocab, tokens, message_ids = np.array([], dtype=object), None, None
+        if (self.has_words and other.has_words
+                and (max_words is None or len(self.tokens) + len(other.tokens) <= max_words)):
+            vocab = self.lookup.append(other.lookup).unique()
+            tokens = np.concatenate([self.tokens, vocab.get_indexer(other.vocab).astype(np.int32)[other.tokens]])
+            message_ids = np.concatenate([self.message_ids, other.message_ids + len(self.dates)]).astype(np.int32)
+        return ChatIndex(
+            vocab=np.asarray(vocab, dtype=object),
+            tokens=tokens,
+            message_ids=message_ids,
+            user_codes=np.concatenate([self.user_codes, users.get_indexer(other.users).astype(np.int32)[other.user_codes]]),
+            users=np.asarray(users, dtype=object),
+            dates=np.concatenate([self.dates, other.dates]),
+        )
+
+    def select(self, users=None, start=None, end=None):
+        # Messages by any of users dated in [start, end), as a mask over
+        # message IDs; None when nothing is filtered
+        if users is None and start is None and end is None:
+            return None
+        mask = np.ones(len(self.dates), dtype=bool)
+        if users is not None:
+            codes = pd.Index(self.users).get_indexer(list(users))
+            mask &= np.isin(self.user_codes, codes[codes >= 0])
+        if start is not None:
+            mask &= self.dates >= np.datetime64(pd.Timestamp(start))
+        if end is not None:
+            mask &= self.dates < np.datetime64(pd.Timestamp(end))
+        return mask
+
+    def counts(self, users=None, start=None, end=None):
+        # Occurrences of every vocab word within the selection; nothing is
+        # counted in an index without words
+        if not self.has_words:
+            return np.zeros(0, dtype=np.int64)
+        mask = self.select(users, start, end)
+        tokens = self.tokens if mask is None else self.tokens[mask[self.message_ids]]
+        return np.bincount(tokens, minlength=len(self.vocab))
+
+    def word_counts(self, users=None, start=None, end=None):
+        counts = self.counts(users, start, end)
+        found = np.flatnonzero(counts)
+        return Counter(dict(zip(self.vocab[found].tolist(), counts[found].tolist())))
+
+    def top_words(self, k, users=None, start=None, end=None):
+        # The k most frequent words of the selection, most frequent first
+        counts = self.counts(users, start, end)
+        top = top_codes(counts, k)
+        return dict(zip(self.vocab[top].tolist(), counts[top].tolist()))
+
+    def top_words_by(self, groups, n_groups, k):
+        # The k most frequent words of every group of messages, where groups
+        # holds each message's group (0 to n_groups - 1). The occurrences are
+        # sorted by group once, then each group is a single bincount over
+        # its own occurrences
+        token_groups = np.asarray(groups)[self.message_ids]
+        order = np.argsort(token_groups.astype(np.int16 if n_groups < 2 ** 15 else np.int64), kind='stable')
+        bounds = np.searchsorted(token_groups[order], np.arange(n_groups + 1))
+        tops = []
+        for group in range(n_groups):
+            counts = np.bincount(self.tokens[order[bounds[group]:bounds[group + 1]]], minlength=len(self.vocab))
+            top = top_codes(counts, k)
+            tops.append(dict(zip(self.vocab[top].tolist(), counts[top].tolist())))
+        return tops
+
+    def search(self, words):
+        # Sorted IDs of the messages that may contain every one of words (in
+        # lowercase) as a substring: those with an indexed word containing
+        # it, which also covers words being typed and words glued into links.
+        # Words the index can't rule out (see indexable) are left out; None
+        # when there are none
+        found = None
+        for word in filter(indexable, (word.translate(PUNCTUATION) for word in words)):
+            codes = np.flatnonzero(self.lookup.str.contains(word, regex=False))
+            ids = np.unique(np.concatenate([self.postings[:0]] + [self.postings[self.offsets[code]:self.offsets[code + 1]]
+                                                                  for code in codes]))
+            found = ids if found is None else np.intersect1d(found, ids, assume_unique=True)
+        return found
+
+
+def indexable(word):
+    # Whether every message containing word (lowercased, punctuation
+    # removed) has an indexed word containing it. Words of at most two
+    # letters and stop words are not indexed, so neither is anything they
+    # may contain
+    return len(word) > 2 and not any(word in stop_word for stop_word in STOP_WORDS)
+
+
+def find_messages(df, index, text='', users=None, start=None, end=None, types=None):
+    # Row positions of df matching every filter, in chat order. A message
+    # matches text when it contains each of its words, in any case, as the
+    # user types them. The index narrows the rows down first; each word is
+    # then checked against the messages left
+    mask = None
+    if types is not None:
+        mask = df['TYPE'].isin(types).to_numpy(dtype=bool)
+    selected = index.select(users, start, end)
+    if selected is not None:
+        mask = selected if mask is None else mask & selected
+
+    words = text.lower().split()
+    rows = index.search(words) if index.has_words else None
+    if rows is None:
+        rows = np.arange(len(df)) if mask is None else np.flatnonzero(mask)
+    elif mask is not None:
+        rows = rows[mask[rows]]
+
+    if words:
+        messages = df['MESSAGE'].iloc[rows].str.lower()
+        found = np.ones(len(rows), dtype=bool)
+        for word in words:
+            found &= messages.str.contains(word, regex=False).fillna(False).to_numpy(dtype=bool)
+        rows = rows[found]
+    return rows
@@ -0,0 +1,80 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import reduce
+from chat_parser import concat_frames, detect_format, no_progress, parse_lines, read_sample, settle_frames
+from chat_profile import stage
+from chat_reader import LINE_START, decode, open_export
+from chat_stats import ChatStats
+
+# Below this size a single process is faster than starting a pool
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+
+# Shards are kept at least this big so per-shard overhead stays small
+MIN_SHARD_BYTES = 8 * 1024 * 1024
+
+
+def find_shard_offsets(text, shards, chat_format):
+    # Cut the export's text into roughly equal byte ranges, moving every cut
+    # forward to the start of the next message header so no message is split
+    data, size = text.data, text.end - text.start
+    offsets = [text.start]
+    for k in range(1, shards):
+        cut = max(offsets[-1], text.start + size * k // shards)
+        for match in LINE_START.finditer(data, cut, text.end):
+            line_end = data.find(b'\n', match.end(), text.end)
+            line = data[match.end():text.end if line_end < 0 else line_end + 1]
+            if chat_format.header.match(decode(line)):
+                if match.end() > offsets[-1]:
+                    offsets.append(match.end())
+                break
+    offsets.append(text.end)
+    return offsets
+
+
+def analyze_shard(chat_file, start, end, chat_format):
+    # Runs in a worker process: parse one byte range and aggregate it
+    with open_export(chat_file) as text:
+        df, shard_format = parse_lines(text.section(start, end), chat_format)
+    return df, shard_format.date_order, ChatStats.from_frame(df)
+
+
+def parse_chat_parallel(chat_file, workers=None, progress=no_progress):
+    # Shards are parsed and aggregated in a process pool; their frames are
+    # concatenated in file order and their stats combined with the
+    # associative ChatStats.merge. Shards settle their date order on their
+    # own, so ambiguous ones read in another order than the export's are
+    # read again and aggregated here
+    workers = workers or os.cpu_count()
+    with open_export(chat_file) as text:
+        size = text.end - text.start
+        chat_format = detect_format(read_sample(text)[0])
+        shards = max(1, min(workers * 4, math.ceil(size / MIN_SHARD_BYTES)))
+        offsets = find_shard_offsets(text, shards, chat_format)
+    ranges = list(zip(offsets, offsets[1:]))
+
+    results = [None] * len(ranges)
+    done = 0
+    # Stages inside the worker processes aren't recorded, only the shards as a whole
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {executor.submit(analyze_shard, chat_file, start, end, chat_format): i
+                   for i, (start, end) in enumerate(ranges)}
+        with stage('parse shards'):
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                done += ranges[i][1] - ranges[i][0]
+                progress('Parsing', done, size)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    with stage('merge shards') as span:
+        frames, date_order, changed = settle_frames([shard_df for shard_df, _, _ in results],
+                                                    [order for _, order, _ in results], chat_format.date_order)
+        shard_stats = [ChatStats.from_frame(frame) if swapped else stats
+                       for frame, swapped, (_, _, stats) in zip(frames, changed, results)]
+        df = concat_frames(frames)
+        stats = reduce(ChatStats.merge, shard_stats)
+        span['rows'] = len(df)
+    return df, chat_format._replace(date_order=date_order), stats
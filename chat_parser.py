@@ -0,0 +1,323 @@
+import re
+from collections import namedtuple
+from itertools import chain
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from chat_profile import stage, stage_iter
+from chat_reader import open_export
+
+# A header layout of one export flavour. `header` is anchored with .match()
+# at the start of each line and exposes the named groups d1, d2, year, hour,
+# minute and optionally second and ampm. `date_order` says which of d1/d2 is
+# the day ('mdy' or 'dmy'); it is resolved per file by detect_format
+ChatFormat = namedtuple('ChatFormat', ['name', 'header', 'date_order'])
+
+_DATE = r'(?P<d1>\d{1,2})[/.\-](?P<d2>\d{1,2})[/.\-](?P<year>\d{2,4}),?\s'
+_TIME_24H = r'(?P<hour>\d{1,2})[:.](?P<minute>\d{2})(?:[:.](?P<second>\d{2}))?'
+# AM/PM may be preceded by a (narrow) no-break space, which \s covers
+_TIME_12H = _TIME_24H + r'\s?(?P<ampm>[AaPp]\.?\s?[Mm]\.?)'
+
+# Registry of supported header layouts, most common first. Android exports
+# use "<stamp> - ", iOS exports "[<stamp>] " (sometimes behind a LRM mark)
+FORMATS = [
+    ChatFormat('android_12h', re.compile(_DATE + _TIME_12H + r'\s-\s'), 'mdy'),
+    ChatFormat('android_24h', re.compile(_DATE + _TIME_24H + r'\s-\s'), 'dmy'),
+    ChatFormat('ios_12h', re.compile(r'\u200e?\[' + _DATE + _TIME_12H + r'\]\s'), 'mdy'),
+    ChatFormat('ios_24h', re.compile(r'\u200e?\[' + _DATE + _TIME_24H + r'\]\s'), 'dmy'),
+]
+
+# Message type rules in priority order: the first pattern found in the
+# stripped, lowercased message decides its type; anything else is 'Text'.
+# LRM marks, which iOS exports put before placeholders, are removed first,
+# and iOS ends the deleted message notices with a period. Each rule costs
+# one vectorized pass over the column, so new types can be added here
+# without any per-row Python
+MESSAGE_TYPES = [
+    ('Media', r'^(?:<media omitted>|(?:image|video|audio|gif|sticker|document) omitted)$'),
+    ('View Once', r'view once'),
+    ('Poll', r'^poll:'),
+    ('Location', r'^(?:live )?location: '),
+    ('Contact', r'\.vcf(?: \(file attached\)|>)$'),
+    ('Link', r'http|www\.'),
+    ('Missed Call', r'missed (?:voice|video) call'),
+    ('Deleted', r'^(?:this message was deleted|you deleted this message)\.?$'),
+    ('Edited', r'<this message was edited>$'),
+]
+
+# The numbers of the date and of the time half of a header (split at its
+# first space). The header pattern has matched already, so these only need
+# to pick the fields out
+DATE_FIELDS = re.compile(r'(\d+)\D+(\d+)\D+(\d+)')
+TIME_FIELDS = re.compile(r'(\d+)\D(\d+)(?:[:.](\d+))?\s?([AaPp])?')
+
+# Amount of text (in characters) sampled from the top of the file to pick a format
+SAMPLE_SIZE = 16 * 1024
+
+# Number of messages collected before a batch is handed over
+BATCH_SIZE = 50000
+
+
+def no_progress(stage, done, total):
+    pass
+
+
+def detect_format(sample_lines):
+    # Pick the layout matching the most header lines in the sample; the rest
+    # of the file is then parsed with that one pattern only
+    best, best_matches = None, []
+    for chat_format in FORMATS:
+        matches = [m for m in map(chat_format.header.match, sample_lines) if m]
+        if len(matches) > len(best_matches):
+            best, best_matches = chat_format, matches
+
+    if best is None:
+        raise ValueError("No messages found in the chat file. Please check the file format.")
+
+    return best._replace(date_order=detect_date_order(best_matches, best.date_order))
+
+
+def detect_date_order(matches, default):
+    first = [int(m.group('d1')) for m in matches]
+    second = [int(m.group('d2')) for m in matches]
+    if max(first) > 12:
+        return 'dmy'
+    if max(second) > 12:
+        return 'mdy'
+
+    # Still ambiguous: exports are chronological, so prefer the reading
+    # under which the dates never go backwards
+    years = [int(m.group('year')) for m in matches]
+    mdy = list(zip(years, first, second))
+    dmy = list(zip(years, second, first))
+    mdy_drops = sum(a > b for a, b in zip(mdy, mdy[1:]))
+    dmy_drops = sum(a > b for a, b in zip(dmy, dmy[1:]))
+    if mdy_drops != dmy_drops:
+        return 'mdy' if mdy_drops < dmy_drops else 'dmy'
+    return default
+
+
+def settle_date_order(first_max, second_max, date_order):
+    # The order a batch's own dates require: a field above 12 is the day.
+    # When neither is, the batch is ambiguous and date_order is kept; see
+    # settle_frames for how the order of the whole export is settled
+    if first_max > 12 >= second_max:
+        return 'dmy'
+    if second_max > 12 >= first_max:
+        return 'mdy'
+    return date_order
+
+
+def iter_messages(lines, chat_format):
+    # Walk the export line by line, folding continuation lines into the
+    # message started by the last header seen
+    header = chat_format.header
+    stamp = None
+    parts = []
+    for line in lines:
+        match = header.match(line)
+        if match:
+            if stamp is not None:
+                yield stamp, ''.join(parts)
+            stamp = line[:match.end()]
+            parts = [line[match.end():]]
+        elif stamp is not None:
+            parts.append(line)
+
+    if stamp is not None:
+        yield stamp, ''.join(parts)
+
+
+def iter_batches(lines, chat_format, batch_size=BATCH_SIZE):
+    # Yield columnar batches of at most batch_size raw messages; splitting
+    # the sender off and parsing the date are left to batch_to_frame
+    batch = {'DATE': [], 'BODY': []}
+    for stamp, body in iter_messages(lines, chat_format):
+        batch['DATE'].append(stamp)
+        batch['BODY'].append(body)
+
+        if len(batch['DATE']) >= batch_size:
+            yield batch
+            batch = {'DATE': [], 'BODY': []}
+
+    if batch['DATE']:
+        yield batch
+
+
+def split_senders(bodies):
+    # Split "User: message" on the first colon for the whole column at once.
+    # System notices ("Messages and calls are end-to-end encrypted") have no
+    # sender and are attributed to 'System'
+    parts = bodies.str.partition(':')
+    has_sender = parts[1] != ''
+
+    users = parts[0].where(has_sender, 'System').str.strip()
+    messages = parts[2].where(has_sender, parts[0]).str.strip()
+    return users, messages
+
+
+def classify_messages(messages):
+    # Lowercase the column once, then give every message the first matching
+    # rule's type
+    types = [name for name, _ in MESSAGE_TYPES] + ['Text', 'Empty']
+    lowered = messages.str.replace('\u200e', '', regex=False).str.strip().str.lower()
+    codes = np.full(len(messages), len(MESSAGE_TYPES), dtype=np.int8)
+    unassigned = np.ones(len(messages), dtype=bool)
+    for code, (_, pattern) in enumerate(MESSAGE_TYPES):
+        mask = unassigned & lowered.str.contains(pattern, regex=True).fillna(False).to_numpy(dtype=bool)
+        codes[mask] = code
+        unassigned &= ~mask
+    codes[messages.isna().to_numpy()] = len(types) - 1
+    return pd.Categorical.from_codes(codes, categories=types)
+
+
+def parse_dates(stamps, chat_format):
+    # Headers have minute (or second) resolution so the same stamp repeats
+    # across many messages, and the distinct stamps share far fewer days and
+    # times of day. Each distinct stamp is only split at its first space;
+    # the numbers are read from the distinct dates and times
+    codes, uniques = pd.factorize(stamps)
+    halves = [stamp.split(None, 1) for stamp in uniques.tolist()]
+    date_codes, dates = pd.factorize(np.array([half[0] for half in halves], dtype=object))
+    time_codes, times = pd.factorize(np.array([half[1] for half in halves], dtype=object))
+
+    d1, d2, year = np.array([DATE_FIELDS.search(date).groups() for date in dates],
+                            dtype=np.int64).reshape(-1, 3).T
+    date_order = settle_date_order(d1.max(initial=0), d2.max(initial=0), chat_format.date_order)
+    month, day = (d1, d2) if date_order == 'mdy' else (d2, d1)
+    # Two digit years follow strptime's %y pivot: 69-99 -> 19xx, 00-68 -> 20xx
+    year = np.where(year >= 100, year, year + np.where(year < 69, 2000, 1900))
+    days = pd.to_datetime(pd.DataFrame({'year': year, 'month': month, 'day': day}))
+
+    fields = [TIME_FIELDS.search(time).groups() for time in times]
+    hour = np.array([int(hour) for hour, _, _, _ in fields], dtype=np.int64)
+    minute = np.array([int(minute) for _, minute, _, _ in fields], dtype=np.int64)
+    second = np.array([int(second or 0) for _, _, second, _ in fields], dtype=np.int64)
+    if 'ampm' in chat_format.header.groupindex:
+        is_pm = np.array([ampm in ('P', 'p') for _, _, _, ampm in fields], dtype=bool)
+        hour = hour % 12 + np.where(is_pm, 12, 0)
+
+    # Headers have at most second resolution
+    seconds = (days.to_numpy().astype('datetime64[s]')[date_codes]
+               + (hour * 3600 + minute * 60 + second)[time_codes].astype('timedelta64[s]'))
+    return pd.Series(seconds[codes]), date_order
+
+
+def proves_date_order(frame):
+    # Whether a frame's dates could only be read in the order they were:
+    # a day above 12 can't have been a month
+    return bool((frame['DATE'].dt.day > 12).any())
+
+
+def swap_day_month(dates):
+    # The dates of an ambiguous frame (every day and month at most 12) read
+    # in the other order
+    midnight = dates.dt.normalize()
+    swapped = pd.to_datetime(pd.DataFrame({'year': dates.dt.year, 'month': dates.dt.day, 'day': dates.dt.month}))
+    return (swapped + (dates - midnight)).astype('datetime64[s]')
+
+
+def settle_frames(frames, orders, date_order):
+    # Consecutive frames of one export (batches, shards, or a cached chat
+    # and its new tail), each decoded in its own date order. The first frame
+    # with a day above 12 settles the order of the whole export (date_order
+    # if none has one); ambiguous frames read the other way are read again
+    # in it. Returns the frames, the settled order and which were changed
+    for frame, order in zip(frames, orders):
+        if proves_date_order(frame):
+            date_order = order
+            break
+
+    settled, changed = [], []
+    for frame, order in zip(frames, orders):
+        swap = order != date_order and len(frame) > 0 and not proves_date_order(frame)
+        settled.append(frame.assign(DATE=swap_day_month(frame['DATE'])) if swap else frame)
+        changed.append(swap)
+    return settled, date_order, changed
+
+
+def batch_to_frame(batch, chat_format):
+    rows = len(batch['BODY'])
+    with stage('split senders', rows):
+        bodies = pd.Series(batch['BODY'], dtype='str')
+        users, messages = split_senders(bodies)
+    with stage('parse dates', rows):
+        dates, date_order = parse_dates(pd.Series(batch['DATE'], dtype='str'), chat_format)
+    with stage('classify', rows):
+        types = classify_messages(messages)
+    return pd.DataFrame({
+        'DATE': dates,
+        'USER': users.astype('category'),
+        'MESSAGE': messages,
+        'TYPE': types,
+    }), date_order
+
+
+def empty_frame():
+    return pd.DataFrame({
+        'DATE': pd.Series(dtype='datetime64[s]'),
+        'USER': pd.Categorical([], categories=pd.Index([], dtype='str')),
+        'MESSAGE': pd.Series(dtype='str'),
+        'TYPE': classify_messages(pd.Series([], dtype='str')),
+    })
+
+
+def concat_frames(frames):
+    # Empty frames (such as the tail of an export that only grew by blank
+    # lines) add nothing and are left out
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return empty_frame()
+    if len(frames) == 1:
+        return frames[0]
+
+    # Categories differ between batches; union them so USER stays categorical
+    users = union_categoricals([frame['USER'] for frame in frames])
+    df = pd.concat([frame[['DATE', 'MESSAGE', 'TYPE']] for frame in frames], ignore_index=True)
+    df.insert(1, 'USER', users)
+    return df
+
+
+def read_sample(lines):
+    # The first SAMPLE_SIZE characters' worth of lines, and an iterator over
+    # all lines including them
+    lines = iter(lines)
+    sample, size = [], 0
+    for line in lines:
+        sample.append(line)
+        size += len(line)
+        if size >= SAMPLE_SIZE:
+            break
+    return sample, chain(sample, lines)
+
+
+def parse_lines(lines, chat_format=None, batch_size=BATCH_SIZE, on_batch=None):
+    # Only one batch of raw strings is alive at a time; each one is converted
+    # to a typed frame before the next is read. lines may also be an
+    # ExportText's chunks. Without a chat_format, the layout is detected from
+    # the first lines. on_batch, if given, is called with the number of
+    # messages parsed so far after every batch. The returned format has the
+    # date order settled over all batches
+    if chat_format is None:
+        sample, lines = read_sample(lines)
+        chat_format = detect_format(sample)
+
+    frames, orders = [], []
+    parsed = 0
+    # 'read' covers reading lines and grouping them into messages
+    for batch in stage_iter('read', iter_batches(lines, chat_format, batch_size), lambda b: len(b['DATE'])):
+        frame, date_order = batch_to_frame(batch, chat_format)
+        frames.append(frame)
+        orders.append(date_order)
+        parsed += len(batch['DATE'])
+        if on_batch is not None:
+            on_batch(parsed)
+    frames, date_order, _ = settle_frames(frames, orders, chat_format.date_order)
+    return concat_frames(frames), chat_format._replace(date_order=date_order)
+
+
+def parse_chat(chat_file, batch_size=BATCH_SIZE):
+    # chat_file is a .txt export or a .zip exported with media
+    with open_export(chat_file) as text:
+        df, _ = parse_lines(text, batch_size=batch_size)
+    return df
@@ -0,0 +1,190 @@
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Not available on Windows, where peak RSS is simply not reported
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The profiler that stage() records into; one per analysis, shared by the
+# worker and Tk threads
+_active = None
+
+# Whether activate() started tracemalloc, and so should stop it again
+_started_tracing = False
+
+# Per thread stack of running (start, peak) traced memory of open stages
+_local = threading.local()
+
+_DONE = object()
+
+
+class StageProfiler:
+    # Collects one span per run of an instrumented stage while active: wall
+    # and CPU time, rows handled, peak RSS of the process and, with
+    # trace_memory, the memory allocated during the stage (from tracemalloc,
+    # which slows allocation-heavy stages down)
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def record(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def summary(self):
+        # One row per stage name, in order of first run
+        rows = {}
+        with self.lock:
+            spans = list(self.spans)
+        for span in spans:
+            row = rows.setdefault(span['name'], {'name': span['name'], 'calls': 0, 'rows': None,
+                                                 'wall': 0.0, 'cpu': 0.0, 'memory_peak': None})
+            row['calls'] += 1
+            row['wall'] += span['wall']
+            row['cpu'] += span['cpu']
+            if span['rows'] is not None:
+                row['rows'] = (row['rows'] or 0) + span['rows']
+            if span['memory_peak'] is not None:
+                row['memory_peak'] = max(row['memory_peak'] or 0, span['memory_peak'])
+        return list(rows.values())
+
+    def to_json(self):
+        with self.lock:
+            spans = list(self.spans)
+        return {'trace_memory': self.trace_memory, 'summary': self.summary(), 'spans': spans}
+
+    def chrome_trace(self):
+        # Trace Event Format, for chrome://tracing or ui.perfetto.dev
+        pid = os.getpid()
+        with self.lock:
+            spans = list(self.spans)
+        threads = {span['thread_id']: span['thread'] for span in spans}
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                  for tid, name in threads.items()]
+        events += [{
+            'name': span['name'],
+            'cat': 'stage',
+            'ph': 'X',
+            'ts': span['start'] * 1e6,
+            'dur': span['wall'] * 1e6,
+            'pid': pid,
+            'tid': span['thread_id'],
+            'args': {key: span[key] for key in ('rows', 'cpu', 'rss_peak', 'memory_delta', 'memory_peak')
+                     if span[key] is not None},
+        } for span in spans]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, ensure_ascii=False, indent=2)
+
+    def save_chrome_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+
+
+def activate(profiler):
+    # Make profiler (or None) the one stages record into; returns the previous
+    # one. Memory tracing is started for a profiler with trace_memory and
+    # stopped again (if it was started here) once none is active, since it
+    # slows everything down
+    global _active, _started_tracing
+    previous, _active = _active, profiler
+    if profiler is not None and profiler.trace_memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+    elif _started_tracing:
+        tracemalloc.stop()
+        _started_tracing = False
+    return previous
+
+
+@contextmanager
+def profiling(profiler):
+    previous = activate(profiler)
+    try:
+        yield profiler
+    finally:
+        activate(previous)
+
+
+def peak_rss():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+@contextmanager
+def stage(name, rows=None):
+    # Time the enclosed block as one run of stage name. Yields the span so
+    # the block can fill in span['rows'] once it knows them; costs next to
+    # nothing when no profiler is active
+    profiler = _active
+    span = {'name': name, 'rows': rows}
+    if profiler is None:
+        yield span
+        return
+
+    tracing = profiler.trace_memory and tracemalloc.is_tracing()
+    stack = _local.__dict__.setdefault('stack', [])
+    if tracing:
+        # Nested stages share tracemalloc's single peak: fold it into the
+        # enclosing stage before resetting it for this one
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        stack.append([current, current])
+
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield span
+    finally:
+        end_wall, end_cpu = time.perf_counter(), time.thread_time()
+        memory_delta = memory_peak = None
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            start, running = stack.pop()
+            peak = max(peak, running)
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            memory_delta, memory_peak = current - start, peak - start
+
+        span.update({
+            'thread': threading.current_thread().name,
+            'thread_id': threading.get_ident(),
+            'start': wall - profiler.origin,
+            'wall': end_wall - wall,
+            'cpu': end_cpu - cpu,
+            'rss_peak': peak_rss(),
+            'memory_delta': memory_delta,
+            'memory_peak': memory_peak,
+        })
+        profiler.record(span)
+
+
+def stage_iter(name, iterable, rows=None):
+    # Record the time spent producing each item of iterable as a run of
+    # stage name; rows(item), if given, counts the rows of an item
+    iterator = iter(iterable)
+    while True:
+        with stage(name) as span:
+            item = next(iterator, _DONE)
+            if item is not _DONE and rows is not None:
+                span['rows'] = rows(item)
+        if item is _DONE:
+            return
+        yield item
@@ -0,0 +1,180 @@
+import codecs
+import io
+import mmap
+import os
+import re
+import struct
+import zipfile
+from contextlib import contextmanager
+
+# Exports are read as bytes, memory-mapped where possible, and decoded a
+# block at a time: the file is never held as one string, which for
+# emoji-heavy chats would take up to four times the file's size
+
+# Bytes that aren't valid UTF-8 become U+FFFD instead of failing the export
+DECODE_ERRORS = 'replace'
+
+# A newline followed by a line that may start a message in any supported
+# layout: a numeric date, behind "[" (and a LRM mark) in iOS exports.
+# Whether one really does is decided by the chat format's header pattern
+# once the line is decoded. Leading with the newline lets the regex engine
+# skip ahead to candidates instead of trying every position. Used to find
+# message boundaries in the raw bytes, e.g. to split an export into shards
+LINE_START = re.compile(rb'\n(?=(?:\xe2\x80\x8e)?\[?\d{1,2}[/.\-]\d{1,2}[/.\-]\d{2,4})')
+
+# Exports are decoded in blocks of whole lines of about this many bytes
+BLOCK_BYTES = 1024 * 1024
+
+# WhatsApp names the chat in an export with media "WhatsApp Chat with
+# <name>.txt" (Android) or "_chat.txt" (iOS); other .txt files are attachments
+CHAT_MEMBER_PREFIXES = ('WhatsApp Chat', '_chat.txt')
+
+# Fixed part of a zip member's local header; the file name and extra field
+# lengths are its last two fields
+LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+
+
+class ExportText:
+    # The text of an export between byte offsets start and end of data,
+    # iterated as decoded lines for parse_lines. Blocks are cut after a
+    # newline, which never splits a UTF-8 sequence, and split on newlines
+    # only. position is the byte offset decoding has reached
+    def __init__(self, data, start=0, end=None):
+        self.data = data
+        self.start = start
+        self.end = len(data) if end is None else end
+        self.position = start
+
+    def section(self, start, end):
+        return ExportText(self.data, start, end)
+
+    def __iter__(self):
+        data = self.data
+        position = self.start
+        while position < self.end:
+            cut = data.find(b'\n', position + BLOCK_BYTES, self.end)
+            block_end = self.end if cut < 0 else cut + 1
+            block = decode(data[position:block_end])
+            position = self.position = block_end
+            yield from io.StringIO(block)
+
+
+class MemberText:
+    # The text of a compressed zip member, inflated and decoded a block at a
+    # time as it is iterated, so neither the member's bytes nor its text are
+    # ever held whole. Blocks may split a character or a line: the
+    # incremental decoder keeps partial characters and the unfinished last
+    # line is carried into the next block. start, end and position count
+    # bytes of the inflated member, like ExportText's
+    def __init__(self, archive, info):
+        self.archive = archive
+        self.info = info
+        self.start = 0
+        self.end = info.file_size
+        self.position = 0
+
+    def __iter__(self):
+        with self.archive.open(self.info) as f:
+            block = f.read(BLOCK_BYTES)
+            # The UTF-8 byte order mark is skipped, UTF-16's picks the byte order
+            utf16 = block.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE))
+            decoder = codecs.getincrementaldecoder('utf-16' if utf16 else 'utf-8-sig')(DECODE_ERRORS)
+            rest = ''
+            while block:
+                self.position += len(block)
+                text = (rest + decoder.decode(block)).replace('\r\n', '\n')
+                cut = text.rfind('\n') + 1
+                rest = text[cut:]
+                yield from io.StringIO(text[:cut])
+                block = f.read(BLOCK_BYTES)
+            rest += decoder.decode(b'', final=True)
+            yield from io.StringIO(rest)
+
+
+def decode(raw):
+    # Newlines are translated like text mode would
+    return raw.decode('utf-8', DECODE_ERRORS).replace('\r\n', '\n')
+
+
+def export_text(data, start=0, end=None):
+    # Skip a UTF-8 byte order mark. UTF-16 exports (written by some backup
+    # tools) are converted to UTF-8 first so they can be scanned as bytes
+    end = len(data) if end is None else end
+    head = data[start:start + 3]
+    if head.startswith(codecs.BOM_UTF8):
+        start += len(codecs.BOM_UTF8)
+    elif head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        data = data[start:end].decode('utf-16', DECODE_ERRORS).encode('utf-8')
+        start, end = 0, len(data)
+    return ExportText(data, start, end)
+
+
+def is_zip_export(chat_file):
+    return os.path.splitext(chat_file)[1].lower() == '.zip'
+
+
+def is_utf16_export(chat_file):
+    # UTF-16 exports are parsed from a converted copy, so offsets in the
+    # file don't point into the text that is parsed
+    with open(chat_file, 'rb') as f:
+        return f.read(2) in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
+
+
+def find_chat_member(archive):
+    # The chat's text file, or the largest .txt if none has a known name
+    texts = [info for info in archive.infolist()
+             if not info.is_dir() and info.filename.lower().endswith('.txt')]
+    if not texts:
+        raise ValueError("No chat text file found in the zip archive.")
+    named = [info for info in texts if os.path.basename(info.filename).startswith(CHAT_MEMBER_PREFIXES)]
+    return max(named or texts, key=lambda info: info.file_size)
+
+
+def member_offset(f, info):
+    # Where a member's data starts: after its local header, whose extra
+    # field may differ from the one in the central directory
+    f.seek(info.header_offset)
+    fields = LOCAL_HEADER.unpack(f.read(LOCAL_HEADER.size))
+    return info.header_offset + LOCAL_HEADER.size + fields[-2] + fields[-1]
+
+
+@contextmanager
+def map_file(f):
+    if os.fstat(f.fileno()).st_size == 0:
+        # Empty files can't be mapped
+        yield b''
+        return
+    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield data
+    finally:
+        try:
+            data.close()
+        except BufferError:
+            # A scan abandoned by an exception still holds the map; it is
+            # unmapped once that goes away
+            pass
+
+
+@contextmanager
+def open_export(chat_file):
+    # Yields the ExportText of an export. Plain exports are memory-mapped.
+    # From a .zip (as WhatsApp exports chats with media) the chat is read
+    # without extracting anything to disk: mapped in place when stored,
+    # inflated as it is read when compressed (see MemberText)
+    if not is_zip_export(chat_file):
+        with open(chat_file, 'rb') as f, map_file(f) as data:
+            yield export_text(data)
+        return
+
+    with zipfile.ZipFile(chat_file) as archive:
+        info = find_chat_member(archive)
+        if info.flag_bits & 0x1:
+            raise ValueError("The chat in the zip archive is encrypted.")
+        if info.compress_type != zipfile.ZIP_STORED:
+            yield MemberText(archive, info)
+            return
+
+    with open(chat_file, 'rb') as f, map_file(f) as data:
+        start = member_offset(f, info)
+        yield export_text(data, start, start + info.file_size)
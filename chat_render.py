@@ -0,0 +1,108 @@
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+import matplotlib
+import numpy as np
+import pandas as pd
+
+# Rendered charts are kept as image files named after a hash of everything
+# that decides how they look: the chat's aggregates, the chart and its
+# options, the file format and the drawing code's version. An unchanged chat
+# is then shown or exported again without drawing anything
+RENDER_DIR = os.path.join(os.path.expanduser('~'), '.whatsapp_analyzer', 'renders')
+MAX_RENDER_BYTES = 256 * 1024 * 1024
+
+# Bump whenever charts are drawn differently so stale images are never reused
+RENDER_VERSION = 1
+
+# Where renders are cached; None renders everything afresh into temporary
+# files
+_render_dir = RENDER_DIR
+
+
+def use_render_dir(path):
+    # Cache renders in path from now on (None to stop caching); returns the
+    # previous directory
+    global _render_dir
+    previous, _render_dir = _render_dir, path
+    return previous
+
+
+@contextmanager
+def rendering_to(path):
+    previous = use_render_dir(path)
+    try:
+        yield path
+    finally:
+        use_render_dir(previous)
+
+
+def render_caching():
+    return _render_dir is not None
+
+
+def stats_digest(stats):
+    # Hash of the aggregates charts are drawn from. The word index's dates
+    # and users stand in for the conversation dynamics, which derive from them
+    digest = hashlib.blake2b(f'{RENDER_VERSION}|{matplotlib.__version__}'.encode(), digest_size=20)
+    for table in (stats.user_counts, stats.type_counts, stats.hourly, stats.heatmap, stats.monthly,
+                  stats.length_counts, stats.emoji_counts):
+        digest.update(repr(list(table.columns) if table.ndim == 2 else [table.name]).encode())
+        digest.update(pd.util.hash_pandas_object(table).to_numpy().tobytes())
+    digest.update(repr(stats.top_words()).encode())
+    digest.update(repr(list(stats.index.users)).encode())
+    digest.update(np.ascontiguousarray(stats.index.dates).tobytes())
+    digest.update(np.ascontiguousarray(stats.index.user_codes).tobytes())
+    return digest.hexdigest()
+
+
+def render_key(*parts):
+    return hashlib.blake2b(repr((RENDER_VERSION,) + parts).encode(), digest_size=20).hexdigest()
+
+
+def evict(cache_dir, max_bytes=MAX_RENDER_BYTES):
+    # Drop least recently used renders until the cache fits in max_bytes
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and not entry.name.endswith('.tmp'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+@contextmanager
+def cached_file(key, fmt, write, max_bytes=MAX_RENDER_BYTES):
+    # Yields the path of the render for key, calling write(path) to create
+    # it when it isn't cached. Several processes may share the cache, so
+    # renders are written to a private file and moved into place. Without a
+    # render dir the render goes to a temporary file, deleted afterwards
+    cache_dir = _render_dir
+    if cache_dir is None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, f'{key}.{fmt}')
+            write(path)
+            yield path
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f'{key}.{fmt}')
+    if os.path.exists(path):
+        # Mark the render as recently used for eviction
+        os.utime(path)
+    else:
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        write(tmp)
+        os.replace(tmp, path)
+        evict(cache_dir, max_bytes)
+    yield path
@@ -0,0 +1,311 @@
+import copy
+import heapq
+import re
+from collections import Counter
+from functools import lru_cache
+import emoji
+import numpy as np
+import pandas as pd
+from chat_columns import day_of_week, epoch_seconds, hour_of_day, month_of_year
+from chat_dynamics import SESSION_GAP, ChatDynamics
+from chat_index import MAX_INDEXED_WORDS, ChatIndex
+from chat_profile import stage
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June',
+          'July', 'August', 'September', 'October', 'November', 'December']
+
+# At most this many distinct words are tracked per chat. Beyond it word
+# counts are kept as a Misra-Gries summary: every count is then low by at
+# most (number of words) / MAX_TRACKED_WORDS, so the frequent words shown
+# in the word cloud keep their order. None counts every word exactly
+MAX_TRACKED_WORDS = 100000
+
+# Number of words handed to the word cloud
+WORD_CLOUD_WORDS = 100
+
+# Number of words per user and per month in the exported word tables
+TABLE_WORDS = 20
+
+
+@lru_cache(maxsize=None)
+def emoji_scanner():
+    # Built once from the emoji package's data: a regex finding runs of
+    # emoji codepoints (so modifiers, ZWJ sequences, flags and keycaps stay
+    # together), the set of known emoji and the longest one's length
+    emojis = frozenset(emoji.EMOJI_DATA)
+    codepoints = sorted({ord(c) for e in emojis for c in e if ord(c) > 127})
+
+    # Collapse the codepoints into ranges, which re matches far faster than
+    # a class listing every character
+    ranges = []
+    for cp in codepoints:
+        if ranges and cp == ranges[-1][1] + 1:
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+    char_class = ''.join(re.escape(chr(a)) if a == b else re.escape(chr(a)) + '-' + re.escape(chr(b))
+                         for a, b in ranges)
+
+    run = re.compile(r'(?:[' + char_class + r']|[0-9#*]\ufe0f?\u20e3)+')
+    return run, emojis, max(map(len, emojis))
+
+
+def split_emoji_run(run, emojis, longest):
+    # Greedy longest-first split of a run into whole emoji
+    found = []
+    i = 0
+    while i < len(run):
+        for size in range(min(longest, len(run) - i), 0, -1):
+            if run[i:i + size] in emojis:
+                found.append(run[i:i + size])
+                i += size
+                break
+        else:
+            i += 1
+    return found
+
+
+def get_emoji_counts(df):
+    # Emoji x user count matrix. Runs are found over the whole column by one
+    # regex and each distinct run is split into emoji only once
+    run_pattern, emojis, longest = emoji_scanner()
+
+    # Every emoji has a non-ASCII codepoint, so plain ASCII messages are
+    # skipped before the more expensive scan
+    candidates = df[df['MESSAGE'].str.contains(r'[^\x00-\x7f]')]
+    runs = pd.DataFrame({
+        'USER': candidates['USER'].astype(str),
+        'RUN': candidates['MESSAGE'].str.findall(run_pattern.pattern),
+    }).explode('RUN').dropna()
+
+    splits = {run: split_emoji_run(run, emojis, longest) for run in runs['RUN'].unique()}
+    pairs = runs.assign(Emoji=runs['RUN'].map(splits)).explode('Emoji').dropna()
+
+    if pairs.empty:
+        return pd.DataFrame(index=pd.Index([], name='Emoji'), dtype='int64')
+    return pairs.groupby(['Emoji', 'USER']).size().unstack(fill_value=0)
+
+
+def trim_counts(counts, capacity=MAX_TRACKED_WORDS):
+    # Misra-Gries reduction: subtract the (capacity + 1)-th largest count
+    # from every word and drop those left at zero
+    if capacity is None or len(counts) <= capacity:
+        return counts
+    threshold = heapq.nlargest(capacity + 1, counts.values())[-1]
+    return Counter({word: count - threshold for word, count in counts.items() if count > threshold})
+
+
+def count_words(df, capacity=MAX_TRACKED_WORDS, max_words=MAX_INDEXED_WORDS):
+    # Word counts and the word index from one tokenizing pass. The counts are
+    # trimmed after every batch, so they stay within capacity words however
+    # large the chat; the index is bounded by max_words (see ChatIndex)
+    word_counts = Counter()
+
+    def count_batch(words, counts):
+        nonlocal word_counts
+        word_counts.update(dict(zip(words.tolist(), counts.tolist())))
+        word_counts = trim_counts(word_counts, capacity)
+
+    index = ChatIndex.from_frame(df, max_words=max_words, on_words=count_batch)
+    return word_counts, index
+
+
+def count_activity(df):
+    # Every user/time table of the dashboard from one bincount over a joint
+    # user x hour x weekday x month code, plus one over user x type; the
+    # tables are sums of that cube along different axes, so the cost does
+    # not grow with the number of users
+    users = df['USER'].astype('category')
+    types = df['TYPE'].astype('category')
+    user_codes = users.cat.codes.to_numpy(dtype=np.int64)
+    type_codes = types.cat.codes.to_numpy(dtype=np.int64)
+    n_users, n_types = len(users.cat.categories), len(types.cat.categories)
+
+    stamps = epoch_seconds(df['DATE'])
+    keys = ((user_codes * 24 + hour_of_day(stamps)) * 7 + day_of_week(stamps)) * 12 + month_of_year(stamps)
+    cube = np.bincount(keys, minlength=n_users * 24 * 7 * 12).reshape(n_users, 24, 7, 12)
+    by_type = np.bincount(user_codes * n_types + type_codes, minlength=n_users * n_types).reshape(n_users, n_types)
+
+    # Tables list users alphabetically and only those with messages
+    present = cube.sum(axis=(1, 2, 3)) > 0
+    names = pd.Index([str(user) for user in users.cat.categories], name='USER')[present]
+    order = np.argsort(names, kind='stable')
+    names = names[order]
+    cube = cube[present][order]
+    by_type = by_type[present][order]
+
+    type_names = pd.Index([str(name) for name in types.cat.categories], name='TYPE')
+    type_counts = pd.DataFrame(by_type, index=names, columns=type_names)
+    type_counts = type_counts.loc[:, type_counts.sum() > 0].sort_index(axis=1)
+
+    # Message lengths are kept as counts per (user, length), enough for an
+    # exact boxplot and mergeable like the other tables
+    lengths = df['MESSAGE'].str.len().fillna(0).to_numpy(dtype=np.int64)
+    pairs, counts = np.unique(user_codes * (lengths.max(initial=0) + 1) + lengths, return_counts=True)
+    length_users, length_values = np.divmod(pairs, lengths.max(initial=0) + 1)
+    all_names = np.array([str(user) for user in users.cat.categories], dtype=object)
+
+    return {
+        'user_counts': pd.Series(cube.sum(axis=(1, 2, 3)), index=names, name='count').sort_values(ascending=False, kind='stable'),
+        'type_counts': type_counts,
+        'hourly': pd.DataFrame(cube.sum(axis=(2, 3)), index=names, columns=pd.RangeIndex(24, name='Hour')),
+        'heatmap': pd.DataFrame(cube.sum(axis=(0, 3)).T, index=pd.RangeIndex(7, name='DayNum'),
+                                columns=pd.RangeIndex(24, name='Hour')),
+        'monthly': pd.DataFrame(cube.sum(axis=(1, 2)).T, index=pd.Index(MONTHS, name='Month'), columns=names),
+        'length_counts': pd.Series(counts, name='count',
+                                   index=pd.MultiIndex.from_arrays([all_names[length_users], length_values],
+                                                                   names=['USER', 'Length'])),
+    }
+
+
+def weighted_percentile(values, cumulative, q):
+    # np.percentile's linear interpolation over sorted values with counts
+    position = q / 100 * (cumulative[-1] - 1)
+    below, above = np.searchsorted(cumulative, [np.floor(position), np.ceil(position)], side='right')
+    return values[below] + (values[above] - values[below]) * (position - np.floor(position))
+
+
+def length_box_stats(length_counts, users, whis=1.5):
+    # Boxplot statistics per user (as matplotlib's boxplot_stats computes
+    # them) from message length counts, ready for Axes.bxp
+    boxes = []
+    for user in users:
+        if user not in length_counts.index.get_level_values('USER'):
+            continue
+        counts = length_counts.xs(user, level='USER').sort_index()
+        values = counts.index.to_numpy(dtype=np.float64)
+        cumulative = np.cumsum(counts.to_numpy())
+        q1, med, q3 = (weighted_percentile(values, cumulative, q) for q in (25, 50, 75))
+        iqr = q3 - q1
+        inside = values[(values >= q1 - whis * iqr) & (values <= q3 + whis * iqr)]
+        whislo = min(inside.min(), q1) if len(inside) else q1
+        whishi = max(inside.max(), q3) if len(inside) else q3
+        outside = (values < whislo) | (values > whishi)
+        boxes.append({
+            'label': user,
+            'q1': q1, 'med': med, 'q3': q3,
+            'whislo': whislo, 'whishi': whishi,
+            'fliers': np.repeat(values[outside], counts.to_numpy()[outside]),
+        })
+    return boxes
+
+
+def add_tables(a, b):
+    return a.add(b, fill_value=0).fillna(0).astype('int64')
+
+
+class ChatStats:
+    # Running aggregates behind the dashboard. Every table is a plain count,
+    # so stats of two disjoint sets of messages combine with merge()
+    def __init__(self, user_counts, type_counts, hourly, heatmap, monthly, length_counts, emoji_counts,
+                 word_counts, index):
+        self.user_counts = user_counts      # messages per user
+        self.type_counts = type_counts      # user x message type
+        self.hourly = hourly                # user x hour of day
+        self.heatmap = heatmap              # day of week x hour of day
+        self.monthly = monthly              # month name x user
+        self.length_counts = length_counts  # messages per (user, message length)
+        self.emoji_counts = emoji_counts    # emoji x user
+        self.word_counts = word_counts      # Counter of cleaned words (see MAX_TRACKED_WORDS)
+        self.index = index                  # ChatIndex of every message (see MAX_INDEXED_WORDS)
+        self.session_gap = SESSION_GAP      # silence in seconds that ends a conversation
+        self.dynamics_by_gap = {}
+
+    def __getstate__(self):
+        # Conversation dynamics are recomputed rather than cached on disk
+        state = self.__dict__.copy()
+        state['dynamics_by_gap'] = {}
+        return state
+
+    @classmethod
+    def from_frame(cls, df):
+        rows = len(df)
+        with stage('aggregate', rows):
+            tables = count_activity(df)
+        with stage('emoji count', rows):
+            emoji_counts = get_emoji_counts(df)
+        with stage('word index', rows):
+            word_counts, index = count_words(df)
+        return cls(**tables, emoji_counts=emoji_counts, word_counts=word_counts, index=index)
+
+    def with_session_gap(self, session_gap):
+        # These stats with their own session gap; the tables and the
+        # dynamics computed so far are shared
+        stats = copy.copy(self)
+        stats.session_gap = session_gap
+        # copy goes through __getstate__, which leaves the dynamics out
+        stats.dynamics_by_gap = self.dynamics_by_gap
+        return stats
+
+    def dynamics(self):
+        # Replies, sessions and streaks for the current session gap, from the
+        # index's time-ordered users; computed once per gap
+        session_gap = self.session_gap
+        if session_gap not in self.dynamics_by_gap:
+            with stage('dynamics', len(self.index.dates)):
+                self.dynamics_by_gap[session_gap] = ChatDynamics.from_arrays(
+                    self.index.dates, self.index.user_codes, self.index.users, session_gap)
+        return self.dynamics_by_gap[session_gap]
+
+    def length_boxes(self):
+        return length_box_stats(self.length_counts, self.user_counts.index)
+
+    def has_word_slices(self):
+        # Words per user or period come from the word index, which isn't
+        # kept for the largest chats (see MAX_INDEXED_WORDS)
+        return self.index.has_words
+
+    def top_words(self, k=WORD_CLOUD_WORDS, users=None, start=None, end=None):
+        # Slices of the chat are counted from the index
+        if users is None and start is None and end is None:
+            return dict(self.word_counts.most_common(k))
+        if not self.has_word_slices():
+            raise ValueError(f"Words per user or period aren't counted for chats of more than "
+                             f"{MAX_INDEXED_WORDS:,} words.")
+        return self.index.top_words(k, users, start, end)
+
+    def words_by_user(self, k=TABLE_WORDS):
+        tops = self.index.top_words_by(self.index.user_codes, len(self.index.users), k)
+        words = dict(zip([str(user) for user in self.index.users], tops))
+        return pd.DataFrame({user: pd.Series(words.get(user, {}), dtype='int64')
+                             for user in self.user_counts.index}).rename_axis('Word').fillna(0).astype('int64')
+
+    def words_by_month(self, k=TABLE_WORDS):
+        months, month_codes = np.unique(np.asarray(self.index.dates, dtype='datetime64[M]'), return_inverse=True)
+        # Messages without a date belong to no month (NaT sorts last)
+        if len(months) and np.isnat(months[-1]):
+            months = months[:-1]
+            month_codes = np.where(month_codes == len(months), -1, month_codes)
+        tops = self.index.top_words_by(month_codes, len(months), k)
+        return pd.DataFrame({str(month): pd.Series(top, dtype='int64')
+                             for month, top in zip(months, tops)}).rename_axis('Word').fillna(0).astype('int64')
+
+    def tables(self):
+        # Every aggregate as a named DataFrame, for export
+        return {
+            'user_counts': self.user_counts.rename('messages').to_frame(),
+            'type_counts': self.type_counts,
+            'hourly': self.hourly,
+            'heatmap': self.heatmap,
+            'monthly': self.monthly,
+            'length_counts': self.length_counts.to_frame(),
+            'emoji_counts': self.emoji_counts,
+            'word_counts': pd.Series(dict(self.word_counts.most_common()), name='count',
+                                     dtype='int64').rename_axis('Word').to_frame(),
+            **({'words_by_user': self.words_by_user(),
+                'words_by_month': self.words_by_month()} if self.has_word_slices() else {}),
+            **self.dynamics().tables(),
+        }
+
+    def merge(self, other):
+        return ChatStats(
+            user_counts=add_tables(self.user_counts, other.user_counts).sort_values(ascending=False),
+            type_counts=add_tables(self.type_counts, other.type_counts),
+            hourly=add_tables(self.hourly, other.hourly),
+            heatmap=add_tables(self.heatmap, other.heatmap),
+            monthly=add_tables(self.monthly, other.monthly).reindex(MONTHS, fill_value=0),
+            length_counts=add_tables(self.length_counts, other.length_counts),
+            emoji_counts=add_tables(self.emoji_counts, other.emoji_counts),
+            word_counts=trim_counts(self.word_counts + other.word_counts),
+            index=self.index.merge(other.index),
+        )
@@ -0,0 +1,263 @@
+import os
+import sqlite3
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from chat_cache import CACHE_DIR, load_chat, stat_key
+from chat_columns import epoch_seconds, hour_of_day
+from chat_dynamics import find_replies, sort_by_time
+from chat_parser import no_progress
+from chat_profile import stage
+
+# Many analyzed exports in one SQLite file: every message, indexed by chat
+# and date, plus per-chat aggregates written when a chat is added, so chats
+# are compared by reading a few small tables instead of re-parsing them
+WORKSPACE_FILE = os.path.join(os.path.expanduser('~'), '.whatsapp_analyzer', 'workspace.sqlite')
+WORKSPACE_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    stat_key TEXT NOT NULL,
+    messages INTEGER NOT NULL,
+    first_date INTEGER,
+    last_date INTEGER,
+    added INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id INTEGER NOT NULL REFERENCES chats (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    date INTEGER NOT NULL,
+    user TEXT NOT NULL,
+    type TEXT NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (chat_id, position)
+);
+CREATE INDEX IF NOT EXISTS messages_date ON messages (date);
+CREATE INDEX IF NOT EXISTS messages_user ON messages (chat_id, user, date);
+CREATE TABLE IF NOT EXISTS chat_users (
+    chat_id INTEGER NOT NULL REFERENCES chats (id) ON DELETE CASCADE,
+    user TEXT NOT NULL,
+    messages INTEGER NOT NULL,
+    replies INTEGER NOT NULL,
+    emoji INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, user)
+);
+CREATE TABLE IF NOT EXISTS chat_months (
+    chat_id INTEGER NOT NULL REFERENCES chats (id) ON DELETE CASCADE,
+    month TEXT NOT NULL,
+    messages INTEGER NOT NULL,
+    replies INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, month)
+);
+CREATE TABLE IF NOT EXISTS chat_hours (
+    chat_id INTEGER NOT NULL REFERENCES chats (id) ON DELETE CASCADE,
+    hour INTEGER NOT NULL,
+    messages INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, hour)
+);
+CREATE TABLE IF NOT EXISTS chat_types (
+    chat_id INTEGER NOT NULL REFERENCES chats (id) ON DELETE CASCADE,
+    type TEXT NOT NULL,
+    messages INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, type)
+);
+CREATE TABLE IF NOT EXISTS chat_emoji (
+    chat_id INTEGER NOT NULL REFERENCES chats (id) ON DELETE CASCADE,
+    emoji TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, emoji)
+);
+"""
+
+# Comparison tables of all chats in a workspace, each keyed by chat name:
+# chats (one row per chat), monthly (month x chat), hourly (chat x hour),
+# types (chat x message type) and emoji (emoji x chat)
+Comparison = namedtuple('Comparison', ['chats', 'monthly', 'hourly', 'types', 'emoji'])
+
+
+def chat_name(chat_file):
+    # "WhatsApp Chat with Karan.txt" is shown as "Karan"; iOS exports are
+    # all called _chat.txt, so those are named after their folder
+    stem = os.path.splitext(os.path.basename(chat_file))[0]
+    if stem == '_chat':
+        stem = os.path.basename(os.path.dirname(os.path.abspath(chat_file))) or stem
+    for prefix in ('WhatsApp Chat with ', 'WhatsApp Chat - '):
+        if stem.startswith(prefix) and len(stem) > len(prefix):
+            return stem[len(prefix):]
+    return stem
+
+
+def unique_names(names):
+    # Chats with the same name get a suffix, as the comparison is keyed by name
+    seen = {}
+    result = []
+    for name in names:
+        seen[name] = seen.get(name, 0) + 1
+        result.append(name if seen[name] == 1 else f"{name} ({seen[name]})")
+    return result
+
+
+def chat_aggregates(df, stats):
+    # The per-chat rows of every aggregate table, computed once when the chat
+    # is added. Replies are counted as in the chat's own dynamics, for the
+    # stats' session gap
+    users = df['USER'].astype('category')
+    user_codes = users.cat.codes.to_numpy(dtype=np.int64)
+    stamps = epoch_seconds(df['DATE'])
+    names = [str(user) for user in users.cat.categories]
+
+    user_messages = np.bincount(user_codes, minlength=len(names))
+    user_replies = stats.dynamics().users['Replies Sent']
+    user_emoji = stats.emoji_counts.sum(axis=0) if len(stats.emoji_counts) else pd.Series(dtype='int64')
+
+    sorted_stamps, sorted_codes = sort_by_time(stamps, user_codes)
+    replies = find_replies(sorted_stamps, sorted_codes, stats.session_gap)
+    months, month_codes = np.unique(sorted_stamps.astype('datetime64[s]').astype('datetime64[M]'), return_inverse=True)
+    month_messages = np.bincount(month_codes, minlength=len(months))
+    month_replies = np.bincount(month_codes, weights=replies, minlength=len(months)).astype(np.int64)
+
+    hours = np.bincount(hour_of_day(stamps), minlength=24)
+    types = stats.type_counts.sum(axis=0)
+    emoji = stats.emoji_counts.sum(axis=1)
+
+    return {
+        'chat_users': [(name, int(user_messages[i]), int(user_replies.get(name, 0)), int(user_emoji.get(name, 0)))
+                       for i, name in enumerate(names) if user_messages[i]],
+        'chat_months': [(str(month), int(count), int(reply))
+                        for month, count, reply in zip(months, month_messages, month_replies)],
+        'chat_hours': [(hour, int(count)) for hour, count in enumerate(hours)],
+        'chat_types': [(str(name), int(count)) for name, count in types.items() if count],
+        'chat_emoji': [(str(name), int(count)) for name, count in emoji.items() if count],
+    }
+
+
+class ChatWorkspace:
+    # A SQLite workspace file. Connections are opened per call, so the
+    # workspace can be used from any thread and by several processes
+    def __init__(self, path=WORKSPACE_FILE):
+        self.path = path
+
+    def connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=60)
+        conn.execute('PRAGMA foreign_keys = ON')
+        if conn.execute('PRAGMA user_version').fetchone()[0] != WORKSPACE_VERSION:
+            # WAL lets the GUI read while batch runs are adding chats
+            conn.execute('PRAGMA journal_mode = WAL')
+            with conn:
+                conn.executescript(SCHEMA)
+                conn.execute(f'PRAGMA user_version = {WORKSPACE_VERSION}')
+        return conn
+
+    def find_chat(self, chat_file):
+        # (id, stat key) of the chat stored for chat_file, or None
+        conn = self.connect()
+        try:
+            return conn.execute('SELECT id, stat_key FROM chats WHERE path = ?',
+                                (os.path.abspath(chat_file),)).fetchone()
+        finally:
+            conn.close()
+
+    def is_current(self, chat_file):
+        # Whether chat_file is stored and hasn't changed since
+        found = self.find_chat(chat_file)
+        return found is not None and found[1] == stat_key(chat_file)
+
+    def add_chat(self, chat_file, progress=no_progress, cache_dir=CACHE_DIR, name=None):
+        # Store chat_file unless it is current already; returns its chat id.
+        # Parsing goes through the chat cache
+        if self.is_current(chat_file):
+            return self.find_chat(chat_file)[0]
+        df, stats = load_chat(chat_file, cache_dir=cache_dir, progress=progress)
+        return self.store_chat(chat_file, df, stats, name)
+
+    def store_chat(self, chat_file, df, stats, name=None):
+        # Write an analyzed chat, replacing an earlier version of the same file
+        path = os.path.abspath(chat_file)
+        key = stat_key(chat_file)
+        stamps = epoch_seconds(df['DATE'])
+        with stage('workspace store', len(df)):
+            aggregates = chat_aggregates(df, stats)
+            rows = zip(range(len(df)), stamps.tolist(), df['USER'].astype(str).tolist(),
+                       df['TYPE'].astype(str).tolist(), df['MESSAGE'].fillna('').tolist())
+
+            conn = self.connect()
+            try:
+                with conn:
+                    conn.execute('DELETE FROM chats WHERE path = ?', (path,))
+                    chat_id = conn.execute(
+                        'INSERT INTO chats (name, path, stat_key, messages, first_date, last_date, added) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (name or chat_name(path), path, key, len(df),
+                         int(stamps.min()) if len(df) else None, int(stamps.max()) if len(df) else None,
+                         int(time.time()))).lastrowid
+                    conn.executemany('INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)',
+                                     ((chat_id,) + row for row in rows))
+                    for table, values in aggregates.items():
+                        if not values:
+                            continue
+                        marks = ', '.join('?' * (len(values[0]) + 1))
+                        conn.executemany(f'INSERT INTO {table} VALUES ({marks})',
+                                         ((chat_id,) + value for value in values))
+            finally:
+                conn.close()
+        return chat_id
+
+    def remove_chat(self, chat_id):
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM chats WHERE id = ?', (chat_id,))
+        finally:
+            conn.close()
+
+    def chats(self):
+        # One row per stored chat, in the order they were added
+        conn = self.connect()
+        try:
+            chats = pd.read_sql_query(
+                'SELECT c.id, c.name, c.path, c.messages, c.first_date, c.last_date, '
+                'COUNT(u.user) AS users, COALESCE(SUM(u.replies), 0) AS replies, '
+                'COALESCE(SUM(u.emoji), 0) AS emoji '
+                'FROM chats c LEFT JOIN chat_users u ON u.chat_id = c.id GROUP BY c.id ORDER BY c.id', conn)
+        finally:
+            conn.close()
+        for column in ('first_date', 'last_date'):
+            chats[column] = pd.to_datetime(chats[column], unit='s')
+        return chats
+
+    def comparison(self):
+        # The aggregate tables of every chat, read without touching messages
+        with stage('workspace compare'):
+            chats = self.chats()
+            conn = self.connect()
+            try:
+                tables = {table: pd.read_sql_query(f'SELECT * FROM {table}', conn)
+                          for table in ('chat_months', 'chat_hours', 'chat_types', 'chat_emoji')}
+            finally:
+                conn.close()
+
+        names = pd.Series(unique_names(chats['name'].tolist()), index=chats['id'])
+        for table in tables.values():
+            table['chat'] = pd.Categorical(table['chat_id'].map(names), categories=names.tolist())
+
+        def pivot(table, index, columns, values):
+            return table.pivot_table(index=index, columns=columns, values=values, aggfunc='sum',
+                                     fill_value=0, observed=False).astype('int64')
+
+        monthly = pivot(tables['chat_months'], 'month', 'chat', 'messages')
+        if len(monthly):
+            # Every month between the first and the last, so gaps show as zero
+            periods = pd.period_range(monthly.index.min(), monthly.index.max(), freq='M')
+            monthly = monthly.reindex(periods.strftime('%Y-%m'), fill_value=0)
+        return Comparison(
+            chats=chats.assign(name=names.to_numpy()).set_index('name'),
+            monthly=monthly.rename_axis('Month'),
+            hourly=pivot(tables['chat_hours'], 'chat', 'hour', 'messages').reindex(columns=range(24), fill_value=0),
+            types=pivot(tables['chat_types'], 'chat', 'type', 'messages'),
+            emoji=pivot(tables['chat_emoji'], 'emoji', 'chat', 'count'),
+        )
@@ -0,0 +1,41 @@
+import os
+import shutil
+import pandas as pd
+from chat_cache import load_chat
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'WhatsApp Chat with Karan.txt')
+
+
+def test_export_grown_by_blank_lines(tmp_path):
+    # The cached export is a prefix, but the tail after it holds no message
+    chat_file = tmp_path / os.path.basename(SAMPLE)
+    shutil.copy(SAMPLE, chat_file)
+    cache_dir = str(tmp_path / 'cache')
+    df, stats = load_chat(str(chat_file), cache_dir=cache_dir, workers=1)
+
+    with open(chat_file, 'ab') as f:
+        f.write(b'\n\n')
+    grown, grown_stats = load_chat(str(chat_file), cache_dir=cache_dir, workers=1)
+
+    assert len(grown) == len(df)
+    assert grown['USER'].tolist() == df['USER'].tolist()
+    assert grown_stats.user_counts.to_dict() == stats.user_counts.to_dict()
+
+
+def test_tail_settles_cached_date_order(tmp_path):
+    # The cached export only had days up to 12 and was read month first;
+    # the grown one has 13/06/23, so the cached rows are read day first
+    chat_file = tmp_path / 'WhatsApp Chat with Bob.txt'
+    lines = [f'05/06/23, 21:{i % 60:02d} - Alice: message {i}\n' for i in range(1000)]
+    chat_file.write_text(''.join(lines), encoding='utf-8')
+    cache_dir = str(tmp_path / 'cache')
+    load_chat(str(chat_file), cache_dir=cache_dir, workers=1)
+
+    with open(chat_file, 'a', encoding='utf-8') as f:
+        f.write('13/06/23, 08:00 - Bob: later\n')
+    df, stats = load_chat(str(chat_file), cache_dir=cache_dir, workers=1)
+
+    assert len(df) == 1001
+    assert (df['DATE'].dt.strftime('%d/%m').iloc[:1000] == '05/06').all()
+    assert df['DATE'].iloc[-1] == pd.Timestamp('2023-06-13 08:00')
+    assert stats.monthly.loc['June'].sum() == 1001
@@ -0,0 +1,13 @@
+import numpy as np
+import pandas as pd
+import pytest
+from chat_dynamics import ChatDynamics
+
+
+def test_session_gap_below_a_minute_is_rejected():
+    dates = pd.Series(pd.to_datetime(['2023-06-05 21:30', '2023-06-05 21:31']))
+    with pytest.raises(ValueError):
+        ChatDynamics.from_arrays(dates, np.array([0, 1]), ['Alice', 'Bob'], session_gap=-300)
+
+    dynamics = ChatDynamics.from_arrays(dates, np.array([0, 1]), ['Alice', 'Bob'], session_gap=60)
+    assert dynamics.session_gap == 60
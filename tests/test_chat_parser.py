@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+from chat_parser import parse_lines, settle_frames
+
+# Enough ambiguous lines that the format sample (and several batches) only
+# ever see days of at most 12
+AMBIGUOUS_LINES = 1500
+BATCH_SIZE = 200
+
+
+def header(layout, clock, date):
+    seconds = ':00' if layout == 'ios' else ''
+    time = f'9:30{seconds} PM' if clock == '12h' else f'21:30{seconds}'
+    return f'[{date}, {time}] ' if layout == 'ios' else f'{date}, {time} - '
+
+
+def export_lines(layout, clock, order):
+    # June 5th over and over, then June 13th, which settles the order
+    def date(day):
+        return f'06/{day:02d}/23' if order == 'mdy' else f'{day:02d}/06/23'
+
+    lines = [header(layout, clock, date(5)) + f'Alice: message {i}\n' for i in range(AMBIGUOUS_LINES)]
+    lines += [header(layout, clock, date(13)) + f'Bob: message {i}\n' for i in range(10)]
+    return lines
+
+
+@pytest.mark.parametrize('layout', ['android', 'ios'])
+@pytest.mark.parametrize('clock', ['12h', '24h'])
+@pytest.mark.parametrize('order', ['mdy', 'dmy'])
+def test_late_day_above_12_settles_every_batch(layout, clock, order):
+    df, chat_format = parse_lines(export_lines(layout, clock, order), batch_size=BATCH_SIZE)
+
+    assert chat_format.name == f'{layout}_{clock}'
+    assert chat_format.date_order == order
+    assert len(df) == AMBIGUOUS_LINES + 10
+    dates = df['DATE'].dt.strftime('%Y-%m-%d %H:%M')
+    assert (dates.iloc[:AMBIGUOUS_LINES] == '2023-06-05 21:30').all()
+    assert (dates.iloc[AMBIGUOUS_LINES:] == '2023-06-13 21:30').all()
+
+
+@pytest.mark.parametrize('order', ['mdy', 'dmy'])
+def test_settled_order_reaches_an_ambiguous_tail(order):
+    # As for an incremental tail or a later shard: the first part is
+    # settled, the second was parsed on its own and is ambiguous
+    lines = export_lines('android', '24h', order)
+    head_df, head_format = parse_lines(lines[AMBIGUOUS_LINES:])
+    other = 'dmy' if order == 'mdy' else 'mdy'
+    tail_df, _ = parse_lines(lines[:AMBIGUOUS_LINES], head_format._replace(date_order=other))
+
+    frames, date_order, changed = settle_frames([head_df, tail_df], [order, other], other)
+
+    assert date_order == order
+    assert changed == [False, True]
+    assert (frames[1]['DATE'] == pd.Timestamp('2023-06-05 21:30')).all()
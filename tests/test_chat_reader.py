@@ -0,0 +1,38 @@
+import codecs
+import zipfile
+import pytest
+import chat_reader
+from chat_reader import open_export
+
+TEXT = ''.join(f'05/06/23, 21:{i % 60:02d} - Alice: message {i} \U0001F600 café\r\n'
+               f'second line {i}\r\n' for i in range(200))
+
+ENCODINGS = {
+    'utf-8': TEXT.encode('utf-8'),
+    'utf-8-bom': codecs.BOM_UTF8 + TEXT.encode('utf-8'),
+    'utf-16': TEXT.encode('utf-16'),
+}
+
+
+def read_lines(path):
+    with open_export(str(path)) as text:
+        lines = list(text)
+        assert text.position == text.end
+    return lines
+
+
+@pytest.mark.parametrize('encoding', list(ENCODINGS))
+@pytest.mark.parametrize('block_bytes', [7, 64, 1024 * 1024])
+def test_compressed_member_matches_plain_export(tmp_path, monkeypatch, encoding, block_bytes):
+    # Small blocks split characters, CRLF pairs and lines between reads
+    monkeypatch.setattr(chat_reader, 'BLOCK_BYTES', block_bytes)
+    plain = tmp_path / 'WhatsApp Chat with Alice.txt'
+    plain.write_bytes(ENCODINGS[encoding])
+    archive = tmp_path / 'WhatsApp Chat with Alice.zip'
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.write(plain, plain.name)
+
+    lines = read_lines(archive)
+
+    assert lines == read_lines(plain)
+    assert ''.join(lines) == TEXT.replace('\r\n', '\n')
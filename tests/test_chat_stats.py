@@ -0,0 +1,48 @@
+from collections import Counter
+import pytest
+import chat_stats
+from chat_parser import parse_lines
+from chat_stats import ChatStats
+
+LINES = [
+    '01/05/23, 10:00 - Alice: apple banana apple\n',
+    '01/05/23, 11:00 - Bob: banana cherry\n',
+    '15/05/23, 09:00 - Alice: cherry cherry date\n',
+    '02/06/23, 12:00 - Bob: apple date date\n',
+    '20/06/23, 18:00 - Carol: banana\n',
+]
+
+
+def expected_top(messages, k):
+    counts = Counter(word for message in messages for word in message.split())
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:k])
+
+
+def test_word_tables_match_a_scan():
+    df, _ = parse_lines(LINES)
+    stats = ChatStats.from_frame(df)
+
+    by_user = stats.words_by_user(k=2)
+    for user in ['Alice', 'Bob', 'Carol']:
+        column = by_user[user][by_user[user] > 0].to_dict()
+        assert column == expected_top(df.loc[df['USER'] == user, 'MESSAGE'], 2)
+
+    by_month = stats.words_by_month(k=3)
+    assert list(by_month.columns) == ['2023-05', '2023-06']
+    for month in by_month.columns:
+        column = by_month[month][by_month[month] > 0].to_dict()
+        assert column == expected_top(df.loc[df['DATE'].dt.strftime('%Y-%m') == month, 'MESSAGE'], 3)
+
+
+def test_word_tables_skipped_without_index(monkeypatch):
+    # Past the index limit the slices can't be counted; say so rather than
+    # return empty tables
+    monkeypatch.setattr(chat_stats.count_words, '__defaults__', (chat_stats.MAX_TRACKED_WORDS, 3))
+    df, _ = parse_lines(LINES)
+    stats = ChatStats.from_frame(df)
+
+    assert not stats.has_word_slices()
+    assert 'words_by_user' not in stats.tables()
+    assert stats.top_words()
+    with pytest.raises(ValueError):
+        stats.top_words(users=['Alice'])
@@ -0,0 +1,13 @@
+import pytest
+from whatsapp_analyzer_cli import parse_args
+
+
+@pytest.mark.parametrize('minutes', ['-5', '0', '1441', 'nan'])
+def test_session_gap_out_of_range_is_rejected(minutes):
+    with pytest.raises(SystemExit):
+        parse_args(['chat.txt', '--session-gap', minutes])
+
+
+@pytest.mark.parametrize('minutes', ['1', '30', '1440'])
+def test_session_gap_in_range(minutes):
+    assert parse_args(['chat.txt', '--session-gap', minutes]).session_gap == float(minutes)
@@ -0,0 +1,154 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import matplotlib
+matplotlib.use('Agg')
+from chat_cache import CACHE_DIR, load_chat
+from chat_charts import export_dashboard
+from chat_dynamics import SESSION_GAP
+from chat_index import MAX_INDEXED_WORDS
+from chat_profile import StageProfiler, profiling, stage
+from chat_workspace import WORKSPACE_FILE, ChatWorkspace
+
+# Headless batch mode: analyze many exports without Tk and write their
+# aggregates and dashboards to an output directory, one folder per export
+#
+#   python whatsapp_analyzer_cli.py exports/ "archive/**/*.txt" -o reports \
+#       --format json csv --charts png svg --jobs 8
+
+TABLE_FORMATS = ['json', 'csv', 'parquet']
+CHART_FORMATS = ['png', 'svg', 'pdf']
+
+
+def expand_inputs(inputs):
+    # Directories contribute their .txt and .zip exports, anything else is a glob
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(path for pattern in ('*.txt', '*.zip')
+                                for path in glob.glob(os.path.join(item, pattern))))
+        else:
+            paths.extend(sorted(glob.glob(item, recursive=True)) or [item])
+    # Keep the first occurrence of every file
+    return list(dict.fromkeys(os.path.abspath(p) for p in paths))
+
+
+def output_names(paths):
+    # One folder per export, named after the file; clashes get a suffix
+    names, seen = {}, {}
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        names[path] = stem if seen[stem] == 1 else f"{stem} ({seen[stem]})"
+    return names
+
+
+def write_tables(stats, out_dir, formats):
+    tables = stats.tables()
+    if 'json' in formats:
+        data = {name: json.loads(table.to_json(orient='index', force_ascii=False, date_format='iso'))
+                for name, table in tables.items()}
+        with open(os.path.join(out_dir, 'stats.json'), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    for name, table in tables.items():
+        if 'csv' in formats:
+            table.to_csv(os.path.join(out_dir, f'{name}.csv'), encoding='utf-8')
+        if 'parquet' in formats:
+            # Parquet needs string column names
+            table.rename(columns=str).reset_index().rename(columns=str).to_parquet(
+                os.path.join(out_dir, f'{name}.parquet'))
+
+
+def analyze_export(chat_file, out_dir, formats, chart_formats, cache_dir, profile=False, workspace=None,
+                   session_gap=SESSION_GAP):
+    # Runs in a worker process; exports are already processed concurrently,
+    # so each one is parsed in a single process
+    profiler = StageProfiler() if profile else None
+    with profiling(profiler):
+        df, stats = load_chat(chat_file, cache_dir=cache_dir, workers=1)
+        stats.session_gap = session_gap
+        if workspace is not None:
+            store = ChatWorkspace(workspace)
+            if not store.is_current(chat_file):
+                store.store_chat(chat_file, df, stats)
+        os.makedirs(out_dir, exist_ok=True)
+        with stage('write tables'):
+            write_tables(stats, out_dir, formats)
+
+        # Dashboards of exports that haven't changed come from the render cache
+        for chart_format in chart_formats:
+            export_dashboard(df, stats, os.path.join(out_dir, f'dashboard.{chart_format}'), chart_format)
+
+    if profiler is not None:
+        profiler.save_json(os.path.join(out_dir, 'profile.json'))
+        profiler.save_chrome_trace(os.path.join(out_dir, 'trace.json'))
+    return len(df), stats.has_word_slices()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze WhatsApp chat exports without the GUI.")
+    parser.add_argument('inputs', nargs='+',
+                        help="Export files (.txt, or .zip with media), directories of exports or glob patterns")
+    parser.add_argument('-o', '--output', default='reports',
+                        help="Directory to write results to (default: reports)")
+    parser.add_argument('--format', nargs='+', choices=TABLE_FORMATS, default=['json'],
+                        help="Formats for the aggregate tables (default: json)")
+    parser.add_argument('--charts', nargs='*', choices=CHART_FORMATS, default=['png'],
+                        help="Dashboard image formats, none to skip charts (default: png)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help="Number of exports analyzed at once (default: CPU count)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help="Parsed-chat cache directory")
+    parser.add_argument('--workspace', nargs='?', const=WORKSPACE_FILE,
+                        help="Also add the exports to a workspace file for comparison in the GUI "
+                             "(default file: the GUI's workspace)")
+    parser.add_argument('--session-gap', type=float, default=SESSION_GAP / 60,
+                        help="Minutes of silence after which a new conversation starts, "
+                             "1 to 1440 (default: 60)")
+    parser.add_argument('--profile', action='store_true',
+                        help="Also write per-stage timings (profile.json) and a Chrome trace (trace.json)")
+    args = parser.parse_args(argv)
+    # As in the GUI, a gap is between a minute and a day
+    if not 1 <= args.session_gap <= 1440:
+        parser.error("--session-gap must be between 1 and 1440 minutes")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        print("No chat exports found.", file=sys.stderr)
+        return 1
+
+    names = output_names(paths)
+    failures = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = {executor.submit(analyze_export, path, os.path.join(args.output, names[path]),
+                                   args.format, args.charts, args.cache_dir, args.profile,
+                                   args.workspace, int(args.session_gap * 60)): path
+                   for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                messages, has_word_slices = future.result()
+                print(f"{path}: {messages:,} messages")
+                if not has_word_slices:
+                    print(f"{path}: more than {MAX_INDEXED_WORDS:,} words, "
+                          f"so words_by_user and words_by_month were skipped")
+            except Exception as e:
+                failures += 1
+                print(f"{path}: Error analyzing chat: {str(e)}", file=sys.stderr)
+
+    print(f"Analyzed {len(paths) - failures} of {len(paths)} exports into {args.output}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
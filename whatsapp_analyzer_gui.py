@@ -1,16 +1,60 @@
+import time
+
+# Taken first thing, for --startup-time
+STARTED = time.perf_counter()
+STARTED_AT = time.time()
+
+import argparse
+import base64
+import glob
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext
-import pandas as pd
-import re
-import matplotlib
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import numpy as np
-from wordcloud import WordCloud
-import string
-import emoji
+from chat_profile import StageProfiler, activate, stage as profile_stage
+
+# pandas, matplotlib, wordcloud and emoji take seconds to import in the
+# frozen executable, so the window is shown first and they are imported by
+# load_libraries() on the worker thread while the user picks a file. Code
+# needing them imports them where it is used
+IMPORTED = time.perf_counter()
+
+# Default gap in the session box; matches chat_dynamics.SESSION_GAP, which
+# is not imported here to keep startup light
+SESSION_GAP_MINUTES = 60
+
+# Image formats the dashboard can be exported as
+DASHBOARD_FORMATS = ['png', 'svg', 'pdf']
+
+# Chats are exported as text, or as a zip when media is included
+EXPORT_PATTERNS = ['*.txt', '*.zip']
+EXPORT_FILETYPES = [("WhatsApp Exports", ' '.join(EXPORT_PATTERNS)), ("Text Files", "*.txt"),
+                    ("Zip Archives", "*.zip"), ("All Files", "*.*")]
+
+# Filter choices that don't filter anything
+ALL_USERS = 'All users'
+ALL_TYPES = 'All types'
+
+class AnalysisCancelled(Exception):
+    pass
+
+def load_libraries():
+    # Import everything the analysis and the charts use; returns when done
+    import matplotlib
+    matplotlib.use('TkAgg')
+    import matplotlib.backends.backend_tkagg
+    import chat_cache
+    import chat_charts
+    import chat_index
+    import chat_workspace
+    from chat_stats import emoji_scanner
+    emoji_scanner()
+    return time.perf_counter()
 
 class ScrollableFrame(ttk.Frame):
     def __init__(self, container, *args, **kwargs):
@@ -30,7 +74,7 @@ class ScrollableFrame(ttk.Frame):
         )
         
         self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=self.scrollbar.set, xscrollcommand=self.scrollbar_x.set)
+        self.canvas.configure(yscrollcommand=self.on_yscroll, xscrollcommand=self.scrollbar_x.set)
         
         self.scrollbar.pack(side="right", fill="y")
         self.scrollbar_x.pack(side="bottom", fill="x")
@@ -38,6 +82,11 @@ class ScrollableFrame(ttk.Frame):
         
         self.bind_mouse_wheel()
         
+    def on_yscroll(self, first, last):
+        # Tell listeners the visible part of the frame moved (scrolled or resized)
+        self.scrollbar.set(first, last)
+        self.event_generate('<<ViewChanged>>')
+        
     def bind_mouse_wheel(self):
         def _on_mousewheel(event):
             self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
@@ -48,6 +97,97 @@ class ScrollableFrame(ttk.Frame):
         self.canvas.bind_all("<MouseWheel>", _on_mousewheel)
         self.canvas.bind_all("<Shift-MouseWheel>", _on_shift_mousewheel)
 
+class VirtualTable:
+    # Drives a Treeview that only ever holds the rows in view. The vertical
+    # scrollbar is mapped onto the whole DataFrame and rows are filled from
+    # it as the view moves; a small block of formatted rows around the view
+    # is kept so short scrolls don't have to format anything
+    def __init__(self, tree, scrollbar, buffer=50):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.buffer = buffer
+        self.df = None
+        self.rows = None
+        self.first = 0
+        self.block_start = 0
+        self.block = []
+        
+        self.scrollbar.configure(command=self.yview)
+        self.tree.bind('<Configure>', lambda e: self.refresh())
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-1))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(1))
+        self.tree.bind('<Prior>', lambda e: self.scroll(-self.visible_rows()))
+        self.tree.bind('<Next>', lambda e: self.scroll(self.visible_rows()))
+        
+    def set_frame(self, df, rows=None):
+        # rows, if given, are the positions of the rows of df to show
+        self.df = df
+        self.rows = rows
+        self.first = 0
+        self.block = []
+        self.tree.delete(*self.tree.get_children())
+        self.refresh()
+        
+    def row_count(self):
+        return len(self.df) if self.rows is None else len(self.rows)
+        
+    def visible_rows(self):
+        row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or 25)
+        # One row's worth of height goes to the headings
+        return max(1, self.tree.winfo_height() // row_height - 1)
+        
+    def _on_mousewheel(self, event):
+        self.scroll(int(-1*(event.delta/120)) * 3)
+        return 'break'
+        
+    def scroll(self, rows):
+        self.first += rows
+        self.refresh()
+        return 'break'
+        
+    def yview(self, *args):
+        # Scrollbar protocol: ('moveto', fraction) or ('scroll', n, 'units'|'pages')
+        if self.df is None:
+            return
+        if args[0] == 'moveto':
+            self.first = int(float(args[1]) * self.row_count())
+            self.refresh()
+        elif args[0] == 'scroll':
+            step = self.visible_rows() if args[2] == 'pages' else 1
+            self.scroll(int(args[1]) * step)
+            
+    def format_rows(self, start, stop):
+        # Format the time and date strings of a slice in one pass
+        window = self.df.iloc[start:stop] if self.rows is None else self.df.iloc[self.rows[start:stop]]
+        times = window['DATE'].dt.strftime('%I:%M:%S %p')
+        dates = window['DATE'].dt.strftime('%B %d, %Y')
+        return list(zip(window['USER'], window['MESSAGE'], times, dates))
+        
+    def refresh(self):
+        if self.df is None:
+            return
+        
+        total = self.row_count()
+        rows = self.visible_rows()
+        self.first = max(0, min(self.first, total - rows))
+        last = min(total, self.first + rows)
+        
+        block_end = self.block_start + len(self.block)
+        if self.first < self.block_start or last > block_end:
+            self.block_start = max(0, self.first - self.buffer)
+            self.block = self.format_rows(self.block_start, min(total, last + self.buffer))
+        
+        self.tree.delete(*self.tree.get_children())
+        for index in range(self.first, last):
+            tag = 'evenrow' if index % 2 == 0 else 'oddrow'
+            self.tree.insert('', 'end', values=self.block[index - self.block_start], tags=(tag,))
+        
+        if total:
+            self.scrollbar.set(self.first / total, last / total)
+        else:
+            self.scrollbar.set(0, 1)
+
 class WhatsAppAnalyzerGUI:
     def __init__(self, root):
         self.root = root
@@ -104,11 +244,32 @@ class WhatsAppAnalyzerGUI:
                               command=self.browse_file)
         browse_btn.pack(side=tk.LEFT, padx=5)
         
-        analyze_btn = ttk.Button(file_frame,
-                               text="Analyze Chat",
-                               style='Dashboard.TButton',
-                               command=self.analyze_chat)
-        analyze_btn.pack(side=tk.LEFT, padx=5)
+        self.analyze_btn = ttk.Button(file_frame,
+                                    text="Analyze Chat",
+                                    style='Dashboard.TButton',
+                                    command=self.analyze_chat)
+        self.analyze_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.cancel_btn = ttk.Button(file_frame,
+                                   text="Cancel",
+                                   style='Dashboard.TButton',
+                                   command=self.cancel_analysis,
+                                   state=tk.DISABLED)
+        self.cancel_btn.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(file_frame,
+                  text="Export Dashboard",
+                  style='Dashboard.TButton',
+                  command=self.export_dashboard).pack(side=tk.LEFT, padx=5)
+        
+        # Progress of the running analysis
+        self.progress_bar = ttk.Progressbar(file_frame, mode='determinate', length=200, maximum=1.0)
+        self.progress_bar.pack(side=tk.LEFT, padx=(15, 5))
+        
+        self.status_text = tk.StringVar()
+        ttk.Label(file_frame,
+                 textvariable=self.status_text,
+                 style='SubHeader.TLabel').pack(side=tk.LEFT, padx=5)
         
         # Create notebook with custom styling
         self.notebook = ttk.Notebook(main_frame)
@@ -124,6 +285,54 @@ class WhatsAppAnalyzerGUI:
         text_frame = ttk.Frame(self.notebook)
         self.notebook.add(text_frame, text="Messages")
         
+        # Filter bar; searches go through the chat's word index
+        filter_frame = ttk.Frame(text_frame)
+        filter_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
+        
+        ttk.Label(filter_frame, text="Search:", style='SubHeader.TLabel').pack(side=tk.LEFT, padx=(0, 5))
+        self.search_text = tk.StringVar()
+        search_entry = ttk.Entry(filter_frame, textvariable=self.search_text, width=30)
+        search_entry.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(filter_frame, text="User:", style='SubHeader.TLabel').pack(side=tk.LEFT, padx=(10, 5))
+        self.filter_user = tk.StringVar(value=ALL_USERS)
+        self.user_box = ttk.Combobox(filter_frame, textvariable=self.filter_user,
+                                     values=[ALL_USERS], state='readonly', width=18)
+        self.user_box.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(filter_frame, text="From:", style='SubHeader.TLabel').pack(side=tk.LEFT, padx=(10, 5))
+        self.filter_start = tk.StringVar()
+        start_entry = ttk.Entry(filter_frame, textvariable=self.filter_start, width=12)
+        start_entry.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(filter_frame, text="To:", style='SubHeader.TLabel').pack(side=tk.LEFT, padx=(10, 5))
+        self.filter_end = tk.StringVar()
+        end_entry = ttk.Entry(filter_frame, textvariable=self.filter_end, width=12)
+        end_entry.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(filter_frame, text="Type:", style='SubHeader.TLabel').pack(side=tk.LEFT, padx=(10, 5))
+        self.filter_type = tk.StringVar(value=ALL_TYPES)
+        self.type_box = ttk.Combobox(filter_frame, textvariable=self.filter_type,
+                                     values=[ALL_TYPES], state='readonly', width=12)
+        self.type_box.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(filter_frame,
+                  text="Clear",
+                  style='Dashboard.TButton',
+                  command=self.clear_filters).pack(side=tk.LEFT, padx=(10, 5))
+        
+        self.match_text = tk.StringVar()
+        ttk.Label(filter_frame, textvariable=self.match_text, style='SubHeader.TLabel').pack(side=tk.LEFT, padx=5)
+        
+        # Filter as the user types, once typing pauses
+        self.filter_job = None
+        search_entry.bind('<KeyRelease>', lambda e: self.schedule_filter())
+        for entry in (start_entry, end_entry):
+            entry.bind('<Return>', lambda e: self.apply_filters())
+            entry.bind('<FocusOut>', lambda e: self.apply_filters())
+        for box in (self.user_box, self.type_box):
+            box.bind('<<ComboboxSelected>>', lambda e: self.apply_filters())
+        
         # Create table with custom styling
         table_container = ttk.Frame(text_frame)
         table_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -164,9 +373,12 @@ class WhatsAppAnalyzerGUI:
         self.tree.column('Date', width=150, minwidth=150)
         
         # Add scrollbars for messages table
-        vsb = ttk.Scrollbar(table_container, orient="vertical", command=self.tree.yview)
+        # The vertical scrollbar is driven by the virtual table below, which
+        # keeps only the visible rows in the tree
+        vsb = ttk.Scrollbar(table_container, orient="vertical")
         hsb = ttk.Scrollbar(table_container, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self.tree.configure(xscrollcommand=hsb.set)
+        self.messages = VirtualTable(self.tree, vsb)
         
         # Grid layout for messages table
         self.tree.grid(row=0, column=0, sticky='nsew')
@@ -204,333 +416,304 @@ class WhatsAppAnalyzerGUI:
         emoji_table_container.grid_rowconfigure(0, weight=1)
         emoji_table_container.grid_columnconfigure(0, weight=1)
         
+        # Conversations tab: who replies to whom and how fast, conversation
+        # starters and daily streaks
+        dynamics_frame = ttk.Frame(self.notebook)
+        self.notebook.add(dynamics_frame, text="Conversations")
+        
+        dynamics_toolbar = ttk.Frame(dynamics_frame)
+        dynamics_toolbar.pack(fill=tk.X, padx=10, pady=(10, 0))
+        
+        ttk.Label(dynamics_toolbar, text="New conversation after (min):", style='SubHeader.TLabel').pack(side=tk.LEFT, padx=(0, 5))
+        self.session_gap = tk.StringVar(value=str(SESSION_GAP_MINUTES))
+        gap_box = ttk.Spinbox(dynamics_toolbar, from_=1, to=1440, textvariable=self.session_gap, width=6)
+        gap_box.pack(side=tk.LEFT, padx=5)
+        gap_box.bind('<Return>', lambda e: self.apply_session_gap())
+        
+        ttk.Button(dynamics_toolbar,
+                  text="Apply",
+                  style='Dashboard.TButton',
+                  command=self.apply_session_gap).pack(side=tk.LEFT, padx=5)
+        
+        self.dynamics_text = tk.StringVar()
+        ttk.Label(dynamics_toolbar, textvariable=self.dynamics_text, style='SubHeader.TLabel').pack(side=tk.LEFT, padx=10)
+        
+        dynamics_container = ttk.Frame(dynamics_frame)
+        dynamics_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        # Per user on top, per (replier, replied to) pair below
+        self.dynamics_trees = []
+        for row in range(2):
+            tree = ttk.Treeview(dynamics_container, show='headings', selectmode='browse')
+            tree_vsb = ttk.Scrollbar(dynamics_container, orient="vertical", command=tree.yview)
+            tree_hsb = ttk.Scrollbar(dynamics_container, orient="horizontal", command=tree.xview)
+            tree.configure(yscrollcommand=tree_vsb.set, xscrollcommand=tree_hsb.set)
+            tree.grid(row=row * 2, column=0, sticky='nsew', pady=(10 if row else 0, 0))
+            tree_vsb.grid(row=row * 2, column=1, sticky='ns', pady=(10 if row else 0, 0))
+            tree_hsb.grid(row=row * 2 + 1, column=0, sticky='ew')
+            dynamics_container.grid_rowconfigure(row * 2, weight=1)
+            self.dynamics_trees.append(tree)
+        dynamics_container.grid_columnconfigure(0, weight=1)
+        
         # Visualizations tab
         self.viz_frame = ScrollableFrame(self.notebook)
         self.notebook.add(self.viz_frame, text="Visualizations")
-        self.viz_canvas = None
+        
+        # Every chart gets a fixed-size placeholder; a chart is only rendered
+        # once its placeholder is scrolled into view on the selected tab, and
+        # then kept until the next analysis. Rendered charts are PNG files in
+        # the render cache, so an unchanged chat's charts are never redrawn
+        self.viz_panels = {}
+        self.viz_canvases = {}
+        self.viz_pending = {}
+        self.chart_data = None
+        self.export_future = None
+        self.chat_data = None
+        self.notebook.bind('<<NotebookTabChanged>>', lambda e: self.render_visible_charts())
+        self.viz_frame.bind('<<ViewChanged>>', lambda e: self.render_visible_charts())
+        
+        # Workspace tab: every chat added is stored with its aggregates in
+        # one SQLite file, so chats are compared without parsing them again
+        self.workspace_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.workspace_frame, text="Workspace")
+        
+        workspace_toolbar = ttk.Frame(self.workspace_frame)
+        workspace_toolbar.pack(fill=tk.X, padx=10, pady=(10, 0))
+        
+        for text, command in (("Add Chats", self.add_workspace_chats),
+                              ("Add Folder", self.add_workspace_folder),
+                              ("Update All", self.refresh_workspace),
+                              ("Remove", self.remove_workspace_chats),
+                              ("Open", self.open_workspace_chat)):
+            ttk.Button(workspace_toolbar,
+                      text=text,
+                      style='Dashboard.TButton',
+                      command=command).pack(side=tk.LEFT, padx=5)
+        
+        self.workspace_text = tk.StringVar()
+        ttk.Label(workspace_toolbar, textvariable=self.workspace_text, style='SubHeader.TLabel').pack(side=tk.LEFT, padx=10)
+        
+        workspace_container = ttk.Frame(self.workspace_frame)
+        workspace_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        workspace_columns = ('Chat', 'Messages', 'Users', 'Replies', 'Emoji', 'From', 'To', 'File')
+        self.workspace_tree = ttk.Treeview(workspace_container,
+                                         columns=workspace_columns,
+                                         show='headings',
+                                         height=10)
+        for col in workspace_columns:
+            numeric = col in ('Messages', 'Users', 'Replies', 'Emoji')
+            self.workspace_tree.heading(col, text=col, anchor=tk.E if numeric else tk.W)
+            self.workspace_tree.column(col, width=100 if numeric else 180 if col != 'File' else 400,
+                                       anchor=tk.E if numeric else tk.W)
+        self.workspace_tree.bind('<Double-1>', lambda e: self.open_workspace_chat())
+        
+        workspace_vsb = ttk.Scrollbar(workspace_container, orient="vertical", command=self.workspace_tree.yview)
+        self.workspace_tree.configure(yscrollcommand=workspace_vsb.set)
+        self.workspace_tree.grid(row=0, column=0, sticky='nsew')
+        workspace_vsb.grid(row=0, column=1, sticky='ns')
+        
+        # Emoji counts of the chats side by side
+        self.workspace_emoji_tree = ttk.Treeview(workspace_container,
+                                               show='headings',
+                                               selectmode='browse')
+        workspace_emoji_vsb = ttk.Scrollbar(workspace_container, orient="vertical", command=self.workspace_emoji_tree.yview)
+        workspace_emoji_hsb = ttk.Scrollbar(workspace_container, orient="horizontal", command=self.workspace_emoji_tree.xview)
+        self.workspace_emoji_tree.configure(yscrollcommand=workspace_emoji_vsb.set, xscrollcommand=workspace_emoji_hsb.set)
+        self.workspace_emoji_tree.grid(row=1, column=0, sticky='nsew', pady=(10, 0))
+        workspace_emoji_vsb.grid(row=1, column=1, sticky='ns', pady=(10, 0))
+        workspace_emoji_hsb.grid(row=2, column=0, sticky='ew')
+        
+        workspace_container.grid_rowconfigure(0, weight=1)
+        workspace_container.grid_rowconfigure(1, weight=1)
+        workspace_container.grid_columnconfigure(0, weight=1)
+        
+        # Comparison tab: charts of all workspace chats
+        self.compare_frame = ScrollableFrame(self.notebook)
+        self.notebook.add(self.compare_frame, text="Comparison")
+        self.compare_canvases = []
+        
+        # The workspace is read the first time one of its tabs is opened
+        self.workspace = None
+        self.workspace_loaded = False
+        self.workspace_future = None
+        self.workspace_paths = {}
+        self.notebook.bind('<<NotebookTabChanged>>', lambda e: self.open_workspace(), add='+')
+        
+        # Performance tab: time, CPU and memory of every stage of the last analysis
+        perf_frame = ttk.Frame(self.notebook)
+        self.notebook.add(perf_frame, text="Performance")
+        
+        perf_toolbar = ttk.Frame(perf_frame)
+        perf_toolbar.pack(fill=tk.X, padx=10, pady=(10, 0))
+        
+        self.trace_memory = tk.BooleanVar(value=False)
+        ttk.Checkbutton(perf_toolbar,
+                       text="Trace memory (slower)",
+                       variable=self.trace_memory).pack(side=tk.LEFT, padx=(0, 10))
+        
+        ttk.Button(perf_toolbar,
+                  text="Export JSON",
+                  style='Dashboard.TButton',
+                  command=lambda: self.export_profile('json')).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(perf_toolbar,
+                  text="Export Chrome Trace",
+                  style='Dashboard.TButton',
+                  command=lambda: self.export_profile('trace')).pack(side=tk.LEFT, padx=5)
+        
+        perf_container = ttk.Frame(perf_frame)
+        perf_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        perf_columns = ('Stage', 'Calls', 'Rows', 'Wall (s)', 'CPU (s)', 'Peak Memory (MB)')
+        self.perf_tree = ttk.Treeview(perf_container,
+                                    columns=perf_columns,
+                                    show='headings',
+                                    selectmode='browse')
+        for col in perf_columns:
+            self.perf_tree.heading(col, text=col, anchor=tk.W if col == 'Stage' else tk.E)
+            self.perf_tree.column(col, width=250 if col == 'Stage' else 120, anchor=tk.W if col == 'Stage' else tk.E)
+        
+        perf_vsb = ttk.Scrollbar(perf_container, orient="vertical", command=self.perf_tree.yview)
+        self.perf_tree.configure(yscrollcommand=perf_vsb.set)
+        self.perf_tree.grid(row=0, column=0, sticky='nsew')
+        perf_vsb.grid(row=0, column=1, sticky='ns')
+        perf_container.grid_rowconfigure(0, weight=1)
+        perf_container.grid_columnconfigure(0, weight=1)
+        
+        # Every analysis records into a fresh profiler, which stays active
+        # for the charts and searches that follow it
+        self.profiler = None
+        self.analysis_start = 0
         
         # Configure root grid
         root.grid_rowconfigure(0, weight=1)
         root.grid_columnconfigure(0, weight=1)
+        
+        # Analysis runs on a worker thread and reports back through a queue
+        # polled from the Tk main loop
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.progress_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.stage = None
+        self.stage_start = 0
+        root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # Queued first on the worker, so an analysis started early waits for it
+        self.libraries = None
+        root.after_idle(self.preload_libraries)
 
-    def preprocess(self, chat_file):
+    def preload_libraries(self):
+        self.libraries = self.executor.submit(load_libraries)
+
+    def load_chat(self, chat_file, progress=None):
+        from chat_cache import load_chat, no_progress
         try:
-            with open(chat_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Extract messages using regex
-            pattern = r'(\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}\s(?:AM|PM))\s-\s(.+?)(?=\n\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}\s(?:AM|PM)\s-\s|$)'
-            matches = re.findall(pattern, content, re.DOTALL)
-            
-            if not matches:
-                raise ValueError("No messages found in the chat file. Please check the file format.")
-            
-            # Process messages
-            data = []
-            for date_str, message in matches:
-                # Split user and message
-                if ':' in message:
-                    user, msg = message.split(':', 1)
-                else:
-                    user = 'System'
-                    msg = message
-                
-                data.append({
-                    'DATE': date_str,
-                    'USER': user.strip(),
-                    'MESSAGE': msg.strip()
-                })
-            
-            # Create DataFrame
-            df = pd.DataFrame(data)
-            
-            # Convert date string to datetime
-            df['DATE'] = pd.to_datetime(df['DATE'], format='%m/%d/%y, %I:%M %p')
-            
-            return df
+            # Reuse the cached parse and aggregates when the export hasn't
+            # changed (or only grew), otherwise stream it line by line
+            return load_chat(chat_file, progress=progress or no_progress)
             
+        except AnalysisCancelled:
+            raise
         except Exception as e:
             raise Exception(f"Error processing file: {str(e)}")
 
-    def create_visualizations(self, df):
-        try:
-            if self.viz_canvas:
-                self.viz_canvas.get_tk_widget().destroy()
-            
-            # Set style for attractive visualizations
-            plt.rcParams['axes.grid'] = True
-            plt.rcParams['grid.alpha'] = 0.3
-            plt.rcParams['axes.facecolor'] = '#ffffff'
-            plt.rcParams['figure.facecolor'] = '#E6F3F5'
-            plt.rcParams['font.family'] = 'Segoe UI'
-            
-            # Create figure with subplots (7 plots now, including word cloud)
-            fig = Figure(figsize=(15, 14), dpi=100)
-            fig.patch.set_facecolor('#E6F3F5')
-            
-            # Custom color palettes
-            user_colors = ['#40E0D0', '#8B00FF', '#00CED1', '#9370DB', '#48D1CC', '#9932CC']
-            type_colors = ['#E0FFFF', '#E6E6FA', '#AFEEEE', '#D8BFD8', '#B0E0E6', '#DDA0DD']
-            
-            # Create a GridSpec to have better control over subplot sizes
-            gs = fig.add_gridspec(4, 2, height_ratios=[1, 1, 1, 1.2])
-            
-            # 1. Messages by User (Pie Chart)
-            ax1 = fig.add_subplot(gs[0, 0])
-            ax1.set_facecolor('#ffffff')
-            user_counts = df['USER'].value_counts()
-            wedges, texts, autotexts = ax1.pie(user_counts.values, 
-                                             labels=user_counts.index, 
-                                             autopct='%1.1f%%',
-                                             colors=user_colors[:len(user_counts)],
-                                             shadow=True)
-            ax1.set_title('Message Distribution by User', 
-                         pad=20, 
-                         fontsize=12, 
-                         fontweight='bold',
-                         color='#40E0D0')
-            
-            # Style for all other plots
-            title_color = '#40E0D0'  # Turquoise
-            label_color = '#8B00FF'  # Violet
-            
-            # 2. Message Types by User (Stacked Bar Chart)
-            ax2 = fig.add_subplot(gs[0, 1])
-            ax2.set_facecolor('#ffffff')
-            message_types = pd.crosstab(df['USER'], df['MESSAGE'].apply(self.get_message_type))
-            bottom = np.zeros(len(message_types.index))
-            
-            for i, col in enumerate(message_types.columns):
-                ax2.bar(message_types.index, 
-                       message_types[col], 
-                       bottom=bottom,
-                       label=col, 
-                       color=type_colors[i % len(type_colors)])
-                bottom += message_types[col]
-            
-            ax2.set_title('Message Types by User', fontsize=12, fontweight='bold', color=title_color)
-            ax2.tick_params(axis='x', rotation=30, colors=label_color)
-            ax2.set_ylabel('Count', color=label_color)
-            ax2.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-            ax2.grid(True, alpha=0.3)
-            
-            # 3. Activity by Hour (Line Plot)
-            ax3 = fig.add_subplot(gs[1, 0])
-            ax3.set_facecolor('#ffffff')
-            df['Hour'] = df['DATE'].dt.hour
-            
-            for i, user in enumerate(df['USER'].unique()):
-                user_data = df[df['USER'] == user]
-                hourly_activity = user_data['Hour'].value_counts().sort_index()
-                hours = range(24)
-                counts = [hourly_activity.get(hour, 0) for hour in hours]
-                ax3.plot(hours, 
-                        counts, 
-                        marker='o', 
-                        linestyle='-', 
-                        linewidth=2,
-                        label=user, 
-                        color=user_colors[i % len(user_colors)])
-            
-            ax3.set_title('Activity by Hour (Per User)', fontsize=12, fontweight='bold', color=title_color)
-            ax3.set_xlabel('Hour of Day', color=label_color)
-            ax3.set_ylabel('Number of Messages', color=label_color)
-            ax3.tick_params(colors=label_color)
-            ax3.set_xticks(range(0, 24, 2))
-            ax3.grid(True, alpha=0.3)
-            ax3.legend()
-            
-            # 4. Messages by Month
-            ax4 = fig.add_subplot(gs[1, 1])
-            ax4.set_facecolor('#ffffff')
-            df['Month'] = pd.Categorical(df['DATE'].dt.strftime('%B'),
-                                       categories=['January', 'February', 'March', 'April', 'May', 'June',
-                                                 'July', 'August', 'September', 'October', 'November', 'December'],
-                                       ordered=True)
-            monthly_by_user = pd.crosstab(df['Month'], df['USER'])
-            
-            x = np.arange(len(monthly_by_user.index))
-            width = 0.35
-            n_users = len(monthly_by_user.columns)
-            
-            for i, user in enumerate(monthly_by_user.columns):
-                offset = width * (i - (n_users-1)/2)
-                ax4.bar(x + offset, 
-                       monthly_by_user[user], 
-                       width, 
-                       label=user,
-                       color=user_colors[i % len(user_colors)])
-            
-            ax4.set_title('Messages by Month (Per User)', fontsize=12, fontweight='bold', color=title_color)
-            ax4.set_xticks(x)
-            ax4.set_xticklabels(monthly_by_user.index, rotation=45, color=label_color)
-            ax4.set_ylabel('Number of Messages', color=label_color)
-            ax4.tick_params(colors=label_color)
-            ax4.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-            ax4.grid(True, alpha=0.3)
-            
-            # 5. Daily Activity Patterns (Heatmap)
-            ax5 = fig.add_subplot(gs[2, 0])
-            ax5.set_facecolor('#ffffff')
-            df['DayNum'] = df['DATE'].dt.dayofweek
-            pivot_table = pd.crosstab(df['DayNum'], df['Hour'])
-            
-            im = ax5.imshow(pivot_table.values, 
-                          cmap='RdPu',  # Purple-based colormap
-                          aspect='auto',
-                          interpolation='nearest')
-            fig.colorbar(im, ax=ax5, label='Number of Messages')
-            
-            ax5.set_title('Activity Heatmap (Day vs Hour)', fontsize=12, fontweight='bold', color=title_color)
-            ax5.set_ylabel('Day of Week', color=label_color)
-            ax5.set_xlabel('Hour of Day', color=label_color)
-            ax5.set_yticks(range(7))
-            ax5.set_yticklabels(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
-                               color=label_color)
-            ax5.set_xticks(range(0, 24, 2))
-            ax5.tick_params(colors=label_color)
-            
-            # 6. Message Length Distribution
-            ax6 = fig.add_subplot(gs[2, 1])
-            ax6.set_facecolor('#ffffff')
-            df['MessageLength'] = df['MESSAGE'].str.len()
-            
-            data = [df[df['USER'] == user]['MessageLength'] for user in df['USER'].unique()]
-            bp = ax6.boxplot(data, 
-                           labels=df['USER'].unique(),
-                           patch_artist=True,
-                           medianprops=dict(color="#40E0D0"),  # Turquoise median line
-                           flierprops=dict(marker='o', markerfacecolor='#8B00FF'))  # Violet outliers
-            
-            # Color each box
-            for i, box in enumerate(bp['boxes']):
-                box.set(facecolor=user_colors[i % len(user_colors)])
-            
-            ax6.set_title('Message Length Distribution by User', fontsize=12, fontweight='bold', color=title_color)
-            ax6.set_ylabel('Message Length (characters)', color=label_color)
-            ax6.tick_params(axis='x', rotation=30, colors=label_color)
-            ax6.grid(True, alpha=0.3)
-            
-            # 7. Word Cloud
-            ax7 = fig.add_subplot(gs[3, :])
-            ax7.set_facecolor('#ffffff')
-            
-            # Prepare text for word cloud
-            def clean_text(text):
-                # Convert to lowercase and remove punctuation
-                text = text.lower()
-                text = text.translate(str.maketrans('', '', string.punctuation))
-                # Remove common WhatsApp words and short words
-                stop_words = {'media', 'omitted', 'message', 'deleted', 'http', 'https', 'www', 'com'}
-                words = text.split()
-                words = [word for word in words if word not in stop_words and len(word) > 2]
-                return ' '.join(words)
-            
-            # Combine all messages and clean the text
-            all_text = ' '.join(df['MESSAGE'].astype(str))
-            cleaned_text = clean_text(all_text)
-            
-            # Create and generate word cloud
-            wordcloud = WordCloud(
-                width=1200,
-                height=400,
-                background_color='white',
-                colormap='PuBu',  # Purple-Blue colormap
-                max_words=100,
-                contour_width=3,
-                contour_color='#40E0D0'  # Turquoise border
-            ).generate(cleaned_text)
-            
-            # Display word cloud
-            ax7.imshow(wordcloud, interpolation='bilinear')
-            ax7.set_title('Most Common Words in Chat', 
-                         fontsize=12, 
-                         fontweight='bold',
-                         color='#40E0D0',
-                         pad=20)
-            ax7.axis('off')
-            
-            # Adjust layout
-            fig.tight_layout(pad=3.0)
-            
-            # Create canvas with custom styling
-            canvas = FigureCanvasTkAgg(fig, master=self.viz_frame.scrollable_frame)
-            canvas.draw()
-            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
-            self.viz_canvas = canvas
-            
-        except Exception as e:
-            self.result_text.delete(1.0, tk.END)
-            self.result_text.insert(tk.END, f"Error creating visualizations: {str(e)}")
-            raise e
+    def show_charts(self, df, stats, digest):
+        from chat_charts import CHARTS, chart_size
+        
+        # Replace the charts of the previous analysis with empty placeholders
+        for panel in self.viz_panels.values():
+            panel.destroy()
+        self.viz_panels = {}
+        self.viz_canvases = {}
+        self.viz_pending = {}
+        self.chart_data = (df, stats, digest)
+        
+        # Two charts per row, full width ones on a row of their own
+        cell = 0
+        for name, _, full_width in CHARTS:
+            width, height = chart_size(full_width)
+            panel = tk.Frame(self.viz_frame.scrollable_frame,
+                             width=int(width * 100),
+                             height=int(height * 100),
+                             bg='#E6F3F5')
+            panel.pack_propagate(False)
+            ttk.Label(panel, text='Loading...', style='SubHeader.TLabel').place(relx=0.5, rely=0.5, anchor=tk.CENTER)
+            if full_width:
+                cell += cell % 2
+                panel.grid(row=cell // 2, column=0, columnspan=2, padx=10, pady=10)
+                cell += 2
+            else:
+                panel.grid(row=cell // 2, column=cell % 2, padx=10, pady=10)
+                cell += 1
+            self.viz_panels[name] = panel
+        
+        self.root.after_idle(self.render_visible_charts)
+
+    def render_visible_charts(self):
+        # Start building the charts whose placeholders are on screen
+        if self.chart_data is None or self.notebook.select() != str(self.viz_frame):
+            return
+        from chat_charts import render_chart
+        df, stats, digest = self.chart_data
+        
+        canvas = self.viz_frame.canvas
+        top = canvas.canvasy(0)
+        bottom = top + canvas.winfo_height()
+        polling = bool(self.viz_pending)
+        for name, panel in self.viz_panels.items():
+            if name in self.viz_canvases or name in self.viz_pending:
+                continue
+            y = panel.winfo_y()
+            if y < bottom and y + panel.winfo_height() > top:
+                # Charts are rendered (or found in the render cache) off the
+                # Tk thread; only showing the image happens here. The worker
+                # gets the session gap as it is now
+                self.viz_pending[name] = self.executor.submit(render_chart, name, df, stats, digest,
+                                                              stats.session_gap)
+        
+        if self.viz_pending and not polling:
+            self.root.after(50, self.poll_charts)
+
+    def poll_charts(self):
+        # Charts of an earlier analysis are no longer in viz_pending and are dropped
+        for name, future in list(self.viz_pending.items()):
+            if not future.done():
+                continue
+            del self.viz_pending[name]
+            panel = self.viz_panels[name]
+            for child in panel.winfo_children():
+                child.destroy()
+            try:
+                with profile_stage(f'draw: {name}'):
+                    image = tk.PhotoImage(data=base64.b64encode(future.result()), format='png')
+                label = tk.Label(panel, image=image, bd=0, bg='#E6F3F5')
+                # Tk drops images that Python no longer references
+                label.image = image
+                label.pack(fill=tk.BOTH, expand=True)
+                self.viz_canvases[name] = label
+            except Exception as e:
+                ttk.Label(panel, text=f'Error creating chart: {str(e)}', style='SubHeader.TLabel').place(relx=0.5, rely=0.5, anchor=tk.CENTER)
+                self.viz_canvases[name] = None
+        
+        if self.viz_pending:
+            self.root.after(50, self.poll_charts)
+        else:
+            self.update_performance()
 
     def browse_file(self):
         filename = filedialog.askopenfilename(
             title="Select WhatsApp Chat File",
-            filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")]
+            filetypes=EXPORT_FILETYPES
         )
         if filename:
             self.file_path.set(filename)
 
-    def get_message_type(self, message):
-        if pd.isna(message):
-            return "Empty"
-        message = str(message).strip()
-        if message == "<Media omitted>":
-            return "Media"
-        elif "http" in message.lower() or "www." in message.lower():
-            return "Link"
-        elif "missed voice call" in message.lower():
-            return "Missed Call"
-        elif "this message was deleted" in message.lower():
-            return "Deleted"
-        else:
-            return "Text"
-
-    def get_emoji_counts(self, df):
-        emoji_counts = {}
-        users = df['USER'].unique()
-        
-        # Initialize emoji counts for each user
-        for user in users:
-            emoji_counts[user] = {}
-        
-        # Count emojis for each user
-        for _, row in df.iterrows():
-            message = row['MESSAGE']
-            user = row['USER']
-            
-            # Extract emojis from message
-            emojis_in_msg = [c for c in message if emoji.is_emoji(c)]
-            
-            # Update counts
-            for em in emojis_in_msg:
-                if em not in emoji_counts[user]:
-                    emoji_counts[user][em] = 0
-                emoji_counts[user][em] += 1
-        
-        # Convert to DataFrame
-        emoji_data = []
-        all_emojis = set()
-        
-        # Get all unique emojis
-        for user_counts in emoji_counts.values():
-            all_emojis.update(user_counts.keys())
-        
-        # Create rows for DataFrame
-        for emoji_char in all_emojis:
-            row = {'Emoji': emoji_char}
-            for user in users:
-                row[user] = emoji_counts[user].get(emoji_char, 0)
-            emoji_data.append(row)
-        
-        return pd.DataFrame(emoji_data)
-
     def update_emoji_table(self, emoji_df):
         # Configure columns
-        columns = ['Emoji'] + list(emoji_df.columns[2:])  # First column is emoji, rest are users
+        columns = ['Emoji'] + list(emoji_df.columns[1:])  # First column is emoji, rest are users
         self.emoji_tree['columns'] = columns
-        print(columns)
         
         # Set column headings
         for col in columns:
@@ -550,52 +733,511 @@ class WhatsAppAnalyzerGUI:
         self.emoji_tree.tag_configure('oddrow', background='#E6F3F5')  # Light turquoise
         self.emoji_tree.tag_configure('evenrow', background='#F5E6F3')  # Light violet
 
+    def read_session_gap(self):
+        # The session gap box in seconds; invalid entries are reset
+        try:
+            minutes = min(max(int(self.session_gap.get()), 1), 1440)
+        except ValueError:
+            minutes = SESSION_GAP_MINUTES
+        self.session_gap.set(str(minutes))
+        return minutes * 60
+
+    def apply_session_gap(self):
+        if self.chat_data is None:
+            return
+        from chat_charts import SESSION_CHARTS
+        df, stats = self.chat_data
+        stats.session_gap = self.read_session_gap()
+        self.update_dynamics_tables(stats)
+        
+        # Charts of the dynamics are drawn again as they come into view;
+        # those still rendering for the old gap are dropped
+        for name in SESSION_CHARTS:
+            self.viz_canvases.pop(name, None)
+            self.viz_pending.pop(name, None)
+        self.render_visible_charts()
+
+    def update_dynamics_tables(self, stats):
+        dynamics = stats.dynamics()
+        summary = dynamics.summary()
+        self.dynamics_text.set(f"{summary['sessions']:,} conversations, "
+                               f"median {summary['median_session_messages']:g} messages and "
+                               f"{summary['median_session_minutes']:g} min long; "
+                               f"daily streak: longest {summary['longest_streak_days']}, "
+                               f"current {summary['current_streak_days']} days")
+        for tree, table in zip(self.dynamics_trees, (dynamics.users, dynamics.pairs)):
+            keys = table.index.nlevels
+            table = table.reset_index()
+            columns = [str(col) for col in table.columns]
+            tree['columns'] = columns
+            for i, col in enumerate(columns):
+                tree.heading(col, text=col, anchor=tk.W if i < keys else tk.CENTER)
+                tree.column(col, width=150, minwidth=100, anchor=tk.W if i < keys else tk.CENTER)
+            tree.delete(*tree.get_children())
+            for i, row in enumerate(table.itertuples(index=False)):
+                values = ['' if value != value else f'{value:,.1f}' if isinstance(value, float) else
+                          f'{value:,}' if isinstance(value, int) else value for value in row]
+                tree.insert('', 'end', values=values, tags=('evenrow' if i % 2 == 0 else 'oddrow',))
+            tree.tag_configure('oddrow', background='#E6F3F5')
+            tree.tag_configure('evenrow', background='#F5E6F3')
+
+    def set_filter_choices(self, df, stats):
+        self.user_box['values'] = [ALL_USERS] + list(stats.user_counts.index)
+        self.type_box['values'] = [ALL_TYPES] + list(df['TYPE'].cat.categories)
+        self.clear_filters()
+
+    def clear_filters(self):
+        self.search_text.set('')
+        self.filter_user.set(ALL_USERS)
+        self.filter_start.set('')
+        self.filter_end.set('')
+        self.filter_type.set(ALL_TYPES)
+        self.apply_filters()
+
+    def schedule_filter(self):
+        if self.filter_job is not None:
+            self.root.after_cancel(self.filter_job)
+        self.filter_job = self.root.after(250, self.apply_filters)
+
+    def apply_filters(self):
+        self.filter_job = None
+        if self.chat_data is None:
+            return
+        import pandas as pd
+        from chat_index import find_messages
+        df, stats = self.chat_data
+        
+        user = self.filter_user.get()
+        message_type = self.filter_type.get()
+        try:
+            # The To date is inclusive
+            start = pd.Timestamp(self.filter_start.get()) if self.filter_start.get().strip() else None
+            end = pd.Timestamp(self.filter_end.get()) + pd.Timedelta(days=1) if self.filter_end.get().strip() else None
+        except ValueError:
+            self.match_text.set('Dates must look like 2023-06-30')
+            return
+        
+        with profile_stage('search', len(df)):
+            rows = find_messages(df, stats.index,
+                                 text=self.search_text.get(),
+                                 users=None if user == ALL_USERS else [user],
+                                 start=start,
+                                 end=end,
+                                 types=None if message_type == ALL_TYPES else [message_type])
+        with profile_stage('table fill', len(rows)):
+            if len(rows) == len(df):
+                self.messages.set_frame(df)
+                self.match_text.set('')
+            else:
+                self.messages.set_frame(df, rows)
+                self.match_text.set(f'{len(rows):,} of {len(df):,} messages')
+
     def analyze_chat(self):
         file_path = self.file_path.get()
         if not file_path:
-            self.tree.delete(*self.tree.get_children())
+            self.chat_data = None
+            self.messages.set_frame(None)
             self.tree.insert('', 'end', values=('Error', 'Please select a chat file first!', '', ''))
             return
         
+        if self.future is not None or self.workspace_future is not None:
+            return
+        
+        self.cancel_event.clear()
+        self.analyze_btn.configure(state=tk.DISABLED)
+        self.cancel_btn.configure(state=tk.NORMAL)
+        self.stage = None
+        self.set_progress('Starting', 0, 0)
+        
+        self.profiler = StageProfiler(trace_memory=self.trace_memory.get())
+        activate(self.profiler)
+        self.analysis_start = time.monotonic()
+        
+        self.future = self.executor.submit(self.run_analysis, file_path, self.read_session_gap())
+        self.root.after(100, self.poll_analysis)
+
+    def run_analysis(self, file_path, session_gap=None):
+        # Runs on the worker thread: nothing in here may touch Tk widgets
+        # Charts are built later, as they come into view
+        with profile_stage('load chat') as span:
+            df, stats = self.load_chat(file_path, progress=self.report_progress)
+            span['rows'] = len(df)
+        if session_gap is not None:
+            stats.session_gap = session_gap
+        stats.dynamics()
+        
+        # Rendered charts are cached under a hash of the aggregates
+        from chat_render import stats_digest
+        with profile_stage('render key', len(df)):
+            digest = stats_digest(stats)
+        return df, stats, digest
+
+    def report_progress(self, stage, done, total):
+        # Called from the worker; raising here aborts the analysis
+        if self.cancel_event.is_set():
+            raise AnalysisCancelled()
+        self.progress_queue.put((stage, done, total))
+
+    def cancel_analysis(self):
+        self.cancel_event.set()
+        self.status_text.set('Cancelling...')
+
+    def set_progress(self, stage, done, total):
+        if stage != self.stage:
+            self.stage = stage
+            self.stage_start = time.monotonic()
+        
+        if not total:
+            self.progress_bar.configure(mode='indeterminate')
+            self.progress_bar.start(15)
+            self.status_text.set(f'{stage}...')
+            return
+        
+        self.progress_bar.stop()
+        self.progress_bar.configure(mode='determinate', value=done / total)
+        
+        # Estimate the time left from the rate of the current stage
+        status = f'{stage} {done / total:.0%}'
+        elapsed = time.monotonic() - self.stage_start
+        if 0 < done < total and elapsed > 0.5:
+            status += f' - about {elapsed * (total - done) / done:.0f} s left'
+        self.status_text.set(status)
+
+    def drain_progress(self):
+        # Show only the latest of the progress reports queued by the worker
+        latest = None
+        while True:
+            try:
+                latest = self.progress_queue.get_nowait()
+            except queue.Empty:
+                break
+        if latest is not None:
+            self.set_progress(*latest)
+
+    def poll_analysis(self):
+        self.drain_progress()
+        
+        if not self.future.done():
+            self.root.after(100, self.poll_analysis)
+            return
+        
+        future, self.future = self.future, None
+        self.progress_bar.stop()
+        self.progress_bar.configure(mode='determinate', value=0)
+        self.analyze_btn.configure(state=tk.NORMAL)
+        self.cancel_btn.configure(state=tk.DISABLED)
+        
         try:
-            # Read and process the chat
-            df = self.preprocess(file_path)
-            
-            # Clear existing items in messages table
-            self.tree.delete(*self.tree.get_children())
+            df, stats, digest = future.result()
             
-            # Format the data for messages table
-            for index, row in df.iterrows():
-                time_str = row['DATE'].strftime('%I:%M:%S %p')
-                date_str = row['DATE'].strftime('%B %d, %Y')
-                
-                tag = 'evenrow' if index % 2 == 0 else 'oddrow'
-                self.tree.insert('', 'end',
-                               values=(row['USER'],
-                                     row['MESSAGE'],
-                                     time_str,
-                                     date_str),
-                               tags=(tag,))
+            # Fill the messages table lazily from the frame
+            self.chat_data = (df, stats)
+            self.set_filter_choices(df, stats)
             
             # Configure row colors for messages table
             self.tree.tag_configure('oddrow', background='#E6F3F5')
             self.tree.tag_configure('evenrow', background='#F5E6F3')
             
             # Update emoji analysis table
-            emoji_df = self.get_emoji_counts(df)
-            self.update_emoji_table(emoji_df)
+            emoji_df = stats.emoji_counts.reset_index()
+            with profile_stage('emoji table', len(emoji_df)):
+                self.update_emoji_table(emoji_df)
+            self.update_dynamics_tables(stats)
+            
+            # Show visualizations
+            self.show_charts(df, stats, digest)
+            self.status_text.set(f'Analyzed {len(df):,} messages in {time.monotonic() - self.analysis_start:.1f} s')
+            self.update_performance()
             
-            # Create visualizations
-            self.create_visualizations(df)
+        except AnalysisCancelled:
+            self.status_text.set('Analysis cancelled')
             
         except Exception as e:
-            self.tree.delete(*self.tree.get_children())
+            self.status_text.set('')
+            self.chat_data = None
+            self.messages.set_frame(None)
             self.tree.insert('', 'end', values=('Error', f'Error analyzing chat: {str(e)}', '', ''))
+        
+        self.update_performance()
+
+    def open_workspace(self):
+        if not self.workspace_loaded and self.notebook.select() in (str(self.workspace_frame), str(self.compare_frame)):
+            self.workspace_loaded = self.update_workspace()
+
+    def add_workspace_chats(self):
+        filenames = filedialog.askopenfilenames(
+            title="Add WhatsApp Chat Files",
+            filetypes=EXPORT_FILETYPES
+        )
+        if filenames:
+            self.update_workspace(paths=filenames)
+
+    def add_workspace_folder(self):
+        # Every export below the folder, including iOS exports in their own folders
+        folder = filedialog.askdirectory(title="Add Folder of WhatsApp Chats")
+        if folder:
+            self.update_workspace(paths=sorted(path for pattern in EXPORT_PATTERNS
+                                               for path in glob.glob(os.path.join(folder, '**', pattern),
+                                                                     recursive=True)))
+
+    def refresh_workspace(self):
+        # Stored chats whose export changed are read again, the others skipped
+        self.update_workspace(paths=list(self.workspace_paths.values()))
+
+    def remove_workspace_chats(self):
+        removed = [int(item) for item in self.workspace_tree.selection()]
+        if removed:
+            self.update_workspace(removed=removed)
+
+    def open_workspace_chat(self):
+        # Analyze the selected chat in the other tabs; the chat cache makes
+        # this as quick as the first analysis was not
+        selection = self.workspace_tree.selection()
+        if not selection:
+            return
+        self.file_path.set(self.workspace_paths[int(selection[0])])
+        self.notebook.select(0)
+        self.analyze_chat()
+
+    def update_workspace(self, paths=(), removed=()):
+        # Returns whether the update was started
+        if self.future is not None or self.workspace_future is not None:
+            self.workspace_text.set('Wait for the running analysis to finish')
+            return False
+        
+        self.cancel_event.clear()
+        self.analyze_btn.configure(state=tk.DISABLED)
+        self.cancel_btn.configure(state=tk.NORMAL)
+        self.stage = None
+        self.set_progress('Reading workspace', 0, 0)
+        
+        self.workspace_future = self.executor.submit(self.run_workspace, list(paths), list(removed))
+        self.root.after(100, self.poll_workspace)
+        return True
+
+    def run_workspace(self, paths, removed):
+        # Runs on the worker thread: store paths (unchanged chats are skipped),
+        # drop removed chats, then read the comparison and build its charts
+        from chat_charts import COMPARE_CHARTS, build_chart
+        from chat_workspace import ChatWorkspace
+        if self.workspace is None:
+            self.workspace = ChatWorkspace()
+        
+        for chat_id in removed:
+            self.workspace.remove_chat(chat_id)
+        
+        failures = []
+        for i, path in enumerate(paths):
+            prefix = f'{i + 1}/{len(paths)} {os.path.basename(path)}:'
+            try:
+                self.workspace.add_chat(path, progress=lambda stage, done, total, prefix=prefix:
+                                        self.report_progress(f'{prefix} {stage}', done, total))
+            except AnalysisCancelled:
+                raise
+            except Exception as e:
+                failures.append(f'{os.path.basename(path)}: {str(e)}')
+        
+        comparison = self.workspace.comparison()
+        figures = []
+        if len(comparison.chats):
+            figures = [build_chart(name, comparison, charts=COMPARE_CHARTS) for name, _, _ in COMPARE_CHARTS]
+        return comparison, figures, failures
+
+    def poll_workspace(self):
+        self.drain_progress()
+        
+        if not self.workspace_future.done():
+            self.root.after(100, self.poll_workspace)
+            return
+        
+        future, self.workspace_future = self.workspace_future, None
+        self.progress_bar.stop()
+        self.progress_bar.configure(mode='determinate', value=0)
+        self.analyze_btn.configure(state=tk.NORMAL)
+        self.cancel_btn.configure(state=tk.DISABLED)
+        self.status_text.set('')
+        
+        try:
+            comparison, figures, failures = future.result()
+            self.show_workspace(comparison, figures)
+            status = f'{len(comparison.chats)} chats, {comparison.chats["messages"].sum():,} messages'
+            if failures:
+                status += f' - {len(failures)} could not be added: ' + '; '.join(failures[:3])
+            self.workspace_text.set(status)
+        except AnalysisCancelled:
+            self.workspace_text.set('Cancelled; chats added so far were kept')
+        except Exception as e:
+            self.workspace_text.set(f'Error updating workspace: {str(e)}')
+        
+        self.update_performance()
+
+    def show_workspace(self, comparison, figures):
+        import pandas as pd
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        
+        chats = comparison.chats
+        self.workspace_paths = dict(zip(chats['id'].tolist(), chats['path']))
+        self.workspace_tree.delete(*self.workspace_tree.get_children())
+        for i, (name, row) in enumerate(chats.iterrows()):
+            self.workspace_tree.insert('', 'end', iid=str(row['id']), tags=('evenrow' if i % 2 == 0 else 'oddrow',), values=(
+                name,
+                f"{row['messages']:,}",
+                f"{row['users']:,}",
+                f"{row['replies']:,}",
+                f"{row['emoji']:,}",
+                '' if pd.isna(row['first_date']) else row['first_date'].strftime('%Y-%m-%d'),
+                '' if pd.isna(row['last_date']) else row['last_date'].strftime('%Y-%m-%d'),
+                row['path'],
+            ))
+        self.workspace_tree.tag_configure('oddrow', background='#E6F3F5')
+        self.workspace_tree.tag_configure('evenrow', background='#F5E6F3')
+        
+        # Most used emoji across all chats first
+        emoji = comparison.emoji
+        emoji = emoji.loc[emoji.sum(axis=1).sort_values(ascending=False, kind='stable').index[:100]]
+        columns = ['Emoji'] + [str(chat) for chat in emoji.columns]
+        self.workspace_emoji_tree['columns'] = columns
+        for col in columns:
+            self.workspace_emoji_tree.heading(col, text=col, anchor=tk.CENTER)
+            self.workspace_emoji_tree.column(col, width=100, minwidth=100, anchor=tk.CENTER)
+        self.workspace_emoji_tree.delete(*self.workspace_emoji_tree.get_children())
+        for i, (symbol, counts) in enumerate(emoji.iterrows()):
+            self.workspace_emoji_tree.insert('', 'end', values=[symbol] + counts.tolist(),
+                                             tags=('evenrow' if i % 2 == 0 else 'oddrow',))
+        self.workspace_emoji_tree.tag_configure('oddrow', background='#E6F3F5')
+        self.workspace_emoji_tree.tag_configure('evenrow', background='#F5E6F3')
+        
+        for canvas in self.compare_canvases:
+            canvas.get_tk_widget().destroy()
+        self.compare_canvases = []
+        for fig in figures:
+            canvas = FigureCanvasTkAgg(fig, master=self.compare_frame.scrollable_frame)
+            canvas.draw()
+            canvas.get_tk_widget().pack(fill=tk.X, padx=10, pady=10)
+            self.compare_canvases.append(canvas)
+
+    def update_performance(self):
+        self.perf_tree.delete(*self.perf_tree.get_children())
+        if self.profiler is None:
+            return
+        for row in self.profiler.summary():
+            memory = row['memory_peak']
+            self.perf_tree.insert('', 'end', values=(
+                row['name'],
+                row['calls'],
+                '' if row['rows'] is None else f"{row['rows']:,}",
+                f"{row['wall']:.3f}",
+                f"{row['cpu']:.3f}",
+                '' if memory is None else f'{memory / 2**20:.1f}',
+            ))
+
+    def export_profile(self, kind):
+        if self.profiler is None:
+            self.status_text.set('Analyze a chat first')
+            return
+        
+        filename = filedialog.asksaveasfilename(
+            title="Export Performance Data",
+            defaultextension='.json',
+            filetypes=[("JSON Files", "*.json"), ("All Files", "*.*")]
+        )
+        if not filename:
+            return
+        
+        try:
+            if kind == 'trace':
+                self.profiler.save_chrome_trace(filename)
+            else:
+                self.profiler.save_json(filename)
+            self.status_text.set(f'Exported {filename}')
+        except OSError as e:
+            self.status_text.set(f'Error exporting: {str(e)}')
+
+    def export_dashboard(self):
+        if self.chart_data is None:
+            self.status_text.set('Analyze a chat first')
+            return
+        if self.export_future is not None:
+            return
+        
+        filename = filedialog.asksaveasfilename(
+            title="Export Dashboard",
+            defaultextension='.png',
+            filetypes=[("PNG Image", "*.png"), ("SVG Image", "*.svg"), ("PDF Document", "*.pdf")]
+        )
+        if not filename:
+            return
+        image_format = os.path.splitext(filename)[1][1:].lower()
+        if image_format not in DASHBOARD_FORMATS:
+            self.status_text.set('Export the dashboard as .png, .svg or .pdf')
+            return
+        
+        # Copied from the render cache when this dashboard was exported
+        # before, otherwise drawn on the worker
+        from chat_charts import export_dashboard
+        df, stats, digest = self.chart_data
+        self.export_future = self.executor.submit(export_dashboard, df, stats, filename, image_format, digest,
+                                                  stats.session_gap)
+        self.status_text.set('Exporting dashboard...')
+        self.root.after(100, self.poll_export, filename)
+
+    def poll_export(self, filename):
+        if not self.export_future.done():
+            self.root.after(100, self.poll_export, filename)
+            return
+        
+        future, self.export_future = self.export_future, None
+        try:
+            future.result()
+            self.status_text.set(f'Exported {filename}')
+        except Exception as e:
+            self.status_text.set(f'Error exporting: {str(e)}')
+        self.update_performance()
+
+    def measure_startup(self, path):
+        # Write how long the window took to appear and the libraries to load,
+        # in seconds since the module started importing, then quit
+        def window_shown(event):
+            if event.widget is self.root and 'window' not in times:
+                self.root.update_idletasks()
+                times['window'] = time.perf_counter() - STARTED
+                self.root.after(10, wait_for_libraries)
+        
+        def wait_for_libraries():
+            if self.libraries is None or not self.libraries.done():
+                self.root.after(10, wait_for_libraries)
+                return
+            times['libraries'] = self.libraries.result() - STARTED
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'frozen': getattr(sys, 'frozen', False), 'started_at': STARTED_AT, 'seconds': times},
+                          f, indent=2)
+            self.on_close()
+        
+        times = {'imports': IMPORTED - STARTED}
+        self.root.bind('<Map>', window_shown, add='+')
+
+    def on_close(self):
+        # Let a running analysis stop at its next checkpoint instead of
+        # keeping the process alive after the window is gone
+        self.cancel_event.set()
+        self.executor.shutdown(wait=False)
+        self.root.destroy()
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze WhatsApp chat exports.")
+    parser.add_argument('--startup-time', metavar='FILE',
+                        help="Write startup timings as JSON to FILE and quit once the window is shown "
+                             "and the analysis libraries are loaded")
+    # Ignore arguments added by the platform, like macOS's -psn_ for app bundles
+    args, _ = parser.parse_known_args(argv)
+    
     root = tk.Tk()
     app = WhatsAppAnalyzerGUI(root)
+    if args.startup_time:
+        app.measure_startup(args.startup_time)
     root.mainloop()
 
 if __name__ == "__main__":
+    # Needed by the shard worker processes in the frozen executable
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file